@@ -5,6 +5,9 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from config import config
+from app.utils.cache import TTLCache
+from app.utils.json_provider import FastJSONProvider
+from app.utils.passwords import init_password_hasher
 
 db = SQLAlchemy()
 
@@ -21,10 +24,22 @@ def create_app(config_name='default'):
     """
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = FastJSONProvider(app)
+    app.json.sort_keys = app.config['JSON_SORT_KEYS']
     
     # 初始化扩展
     db.init_app(app)
     CORS(app, origins=app.config['CORS_ORIGINS'])
+    app.extensions['overview_cache'] = TTLCache(
+        maxsize=2, ttl=app.config['OVERVIEW_CACHE_MAX_AGE']
+    )
+    app.extensions['user_cache'] = TTLCache(
+        maxsize=app.config['AUTH_CACHE_SIZE'], ttl=app.config['AUTH_CACHE_TTL']
+    )
+    app.extensions['operator_cache'] = TTLCache(
+        maxsize=app.config['OPERATOR_CACHE_SIZE'], ttl=app.config['OPERATOR_CACHE_TTL']
+    )
+    init_password_hasher(app)
     
     # 注册蓝图
     from app.routes.auth import auth_bp
@@ -34,6 +49,8 @@ def create_app(config_name='default'):
     from app.routes.outbound import outbound_bp
     from app.routes.tasks import tasks_bp
     from app.routes.statistics import statistics_bp
+    from app.routes.changes import changes_bp
+    from app.routes.jobs import jobs_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(plates_bp, url_prefix='/api/plates')
@@ -42,9 +59,41 @@ def create_app(config_name='default'):
     app.register_blueprint(outbound_bp, url_prefix='/api/outbound')
     app.register_blueprint(tasks_bp, url_prefix='/api/tasks')
     app.register_blueprint(statistics_bp, url_prefix='/api/statistics')
+    app.register_blueprint(changes_bp, url_prefix='/api/changes')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
     
     # 创建数据库表
     with app.app_context():
+        from app.utils.storage import configure_storage
+        configure_storage(app)
+        
         db.create_all()
+        
+        from app.utils.schema import upgrade_schema
+        from app.utils.search import ensure_search_indexes
+        from app.utils.low_stock import ensure_low_stock_triggers
+        from app.utils.changes import ensure_change_triggers
+        from app.utils.versions import ensure_version_triggers
+        from app.utils.ledger import ensure_ledger_triggers
+        from app.utils.stock import backfill_received_at
+        from app.utils.locations import backfill_locations
+        upgrade_schema()
+        backfill_received_at()
+        backfill_locations()
+        ensure_low_stock_triggers()
+        ensure_change_triggers()
+        ensure_version_triggers()
+        ensure_ledger_triggers()
+        app.extensions['fts_search'] = ensure_search_indexes()
+        
+        from app.utils.metrics import init_metrics
+        from app.utils.compression import init_compression
+        init_metrics(app)
+        init_compression(app)
+        
+        from app.utils.jobs import init_jobs
+        from app.utils.ledger import init_ledger
+        init_jobs(app)
+        init_ledger(app)
     
     return app
@@ -1,9 +1,10 @@
 """
 数据库模型定义
 """
+import json
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from app.utils.passwords import hash_password, verify_password
 from app.utils.time_utils import get_beijing_time
 
 
@@ -14,8 +15,8 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
-    real_name = db.Column(db.String(100), nullable=False)
-    role = db.Column(db.String(20), nullable=False, default='warehouse')  # admin/warehouse/dispatcher
+    real_name = db.Column(db.String(100), nullable=False, index=True)
+    role = db.Column(db.String(20), nullable=False, default='warehouse', index=True)  # admin/warehouse/dispatcher
     status = db.Column(db.String(20), nullable=False, default='active')  # active/inactive
     created_at = db.Column(db.DateTime, nullable=False, default=get_beijing_time)
     
@@ -36,12 +37,12 @@ class User(db.Model):
     inventory_checks = db.relationship('InventoryCheck', backref='checker', lazy='dynamic')
     
     def set_password(self, password):
-        """设置密码（加密存储）"""
-        self.password_hash = generate_password_hash(password)
+        """设置密码（加密存储，哈希在进程池中计算）"""
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        """验证密码"""
-        return check_password_hash(self.password_hash, password)
+        """验证密码（在进程池中校验）"""
+        return verify_password(self.password_hash, password)
     
     def to_dict(self):
         """转换为字典"""
@@ -89,17 +90,61 @@ class AluminumPlate(db.Model):
         return f'<AluminumPlate {self.model} - {self.specification}>'
 
 
+class Location(db.Model):
+    """库位表（仓库/库区/货架/货位四级，path 为物化路径，如 WH1/Z1/R01/）"""
+    __tablename__ = 'locations'
+    
+    LEVELS = ('warehouse', 'zone', 'rack', 'slot')
+    
+    id = db.Column(db.Integer, primary_key=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('locations.id'), index=True)
+    code = db.Column(db.String(50), nullable=False)  # 本级编码，如 R01
+    level = db.Column(db.Integer, nullable=False)  # 1-4，对应 LEVELS
+    path = db.Column(db.String(255), nullable=False, unique=True)  # 以 / 结尾，子孙库位的 path 以此为前缀
+    
+    @property
+    def label(self):
+        """展示名称，如 WH1-Z1-R01"""
+        return self.path.rstrip('/').replace('/', '-')
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'parent_id': self.parent_id,
+            'code': self.code,
+            'level': self.LEVELS[self.level - 1],
+            'path': self.path,
+            'label': self.label
+        }
+    
+    def __repr__(self):
+        return f'<Location {self.path}>'
+
+
 class Inventory(db.Model):
     """库存表"""
     __tablename__ = 'inventories'
+    __table_args__ = (
+        db.Index('ix_inventories_plate_batch', 'plate_id', 'batch_number'),
+        # 部分索引：只包含低库存行，预警列表和低库存计数只需扫描该索引
+        db.Index('ix_inventories_is_low', 'quantity', sqlite_where=db.text('is_low = 1')),
+        # 部分索引：只包含仍有可用数量的批次，按入库时间先进先出分配出库时顺序读取
+        db.Index('ix_inventories_fifo', 'plate_id', 'received_at',
+                 sqlite_where=db.text('quantity > reserved_quantity')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    plate_id = db.Column(db.Integer, db.ForeignKey('aluminum_plates.id'), nullable=False, index=True)
+    plate_id = db.Column(db.Integer, db.ForeignKey('aluminum_plates.id'), nullable=False)  # 由 ix_inventories_plate_batch 覆盖
     quantity = db.Column(db.Integer, nullable=False, default=0)
-    location = db.Column(db.String(200))  # 存放位置
+    reserved_quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 待审批出库占用数量
+    location = db.Column(db.String(200))  # 存放位置（录入的原始文本）
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), index=True)  # 解析后的库位
     batch_number = db.Column(db.String(100), index=True)  # 批次号
     warning_threshold = db.Column(db.Integer, default=10)  # 预警阈值
-    last_updated = db.Column(db.DateTime, nullable=False, default=get_beijing_time, onupdate=get_beijing_time)
+    received_at = db.Column(db.DateTime, default=get_beijing_time)  # 批次首次入库时间，出库按此先进先出
+    is_low = db.Column(db.Boolean, nullable=False, default=False, server_default='0')  # 是否低库存，由触发器维护
+    last_updated = db.Column(db.DateTime, nullable=False, default=get_beijing_time, onupdate=get_beijing_time, index=True)
     
     # 关系
     inventory_checks = db.relationship('InventoryCheck', backref='inventory', lazy='dynamic')
@@ -115,12 +160,14 @@ class Inventory(db.Model):
             'unit': plate_info.get('unit', '张'),
             'supplier': plate_info.get('supplier', ''),
             'totalQuantity': self.quantity,
-            'availableQuantity': self.quantity,
-            'reservedQuantity': 0,
+            'availableQuantity': self.quantity - (self.reserved_quantity or 0),
+            'reservedQuantity': self.reserved_quantity or 0,
             'defectiveQuantity': 0,
             'location': self.location,
+            'locationId': self.location_id,
             'batchNumber': self.batch_number,
             'warningThreshold': self.warning_threshold,
+            'isLow': bool(self.is_low),
             'updatedAt': self.last_updated.isoformat() if self.last_updated else None
         }
     
@@ -167,10 +214,14 @@ class InboundRecord(db.Model):
 class OutboundRecord(db.Model):
     """出库记录表"""
     __tablename__ = 'outbound_records'
+    __table_args__ = (
+        db.Index('ix_outbound_records_status_time', 'status', 'outbound_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     plate_id = db.Column(db.Integer, db.ForeignKey('aluminum_plates.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
+    inventory_id = db.Column(db.Integer, db.ForeignKey('inventories.id'))  # 申请时预留库存的（首个）批次，全部批次见 outbound_allocations
     applicant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     approver_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending/approved/rejected
@@ -184,6 +235,7 @@ class OutboundRecord(db.Model):
             'plate_id': self.plate_id,
             'plate': self.plate.to_dict() if self.plate else None,
             'quantity': self.quantity,
+            'inventory_id': self.inventory_id,
             'applicant_id': self.applicant_id,
             'applicant': self.applicant.real_name if self.applicant else None,
             'approver_id': self.approver_id,
@@ -197,6 +249,22 @@ class OutboundRecord(db.Model):
         return f'<OutboundRecord {self.id} - {self.status}>'
 
 
+class OutboundAllocation(db.Model):
+    """出库分配明细（出库申请在各库存批次上预留、扣减的数量）"""
+    __tablename__ = 'outbound_allocations'
+    __table_args__ = (
+        db.UniqueConstraint('outbound_id', 'inventory_id', name='uq_outbound_allocations_line'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    outbound_id = db.Column(db.Integer, db.ForeignKey('outbound_records.id'), nullable=False)
+    inventory_id = db.Column(db.Integer, db.ForeignKey('inventories.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<OutboundAllocation {self.outbound_id} - {self.inventory_id} x {self.quantity}>'
+
+
 class DispatchTask(db.Model):
     """调度任务表"""
     __tablename__ = 'dispatch_tasks'
@@ -209,7 +277,7 @@ class DispatchTask(db.Model):
     status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending/in_progress/completed
     priority = db.Column(db.String(20), nullable=False, default='medium')  # high/medium/low
     due_date = db.Column(db.DateTime, index=True)
-    created_at = db.Column(db.DateTime, nullable=False, default=get_beijing_time)
+    created_at = db.Column(db.DateTime, nullable=False, default=get_beijing_time, index=True)
     completed_at = db.Column(db.DateTime)
     
     def to_dict(self):
@@ -233,6 +301,20 @@ class DispatchTask(db.Model):
         return f'<DispatchTask {self.id} - {self.title}>'
 
 
+# 领取任务的顺序：优先级高的在前，有截止时间且截止早的在前，最后按ID。
+# 用字面量而非绑定参数，使查询中的表达式与 ix_dispatch_tasks_claim 的索引表达式一致
+TASK_PRIORITY_RANK = db.case(
+    (DispatchTask.priority == db.literal_column("'high'"), db.literal_column('0')),
+    (DispatchTask.priority == db.literal_column("'medium'"), db.literal_column('1')),
+    else_=db.literal_column('2')
+)
+TASK_CLAIM_ORDER = (TASK_PRIORITY_RANK, DispatchTask.due_date.is_(None), DispatchTask.due_date, DispatchTask.id)
+TASK_PENDING = DispatchTask.status == db.literal_column("'pending'")
+
+# 部分索引：只包含待处理任务，按执行人取领取顺序最靠前的任务只需读取一行（id 为隐含的最后一列）
+db.Index('ix_dispatch_tasks_claim', DispatchTask.assignee_id, *TASK_CLAIM_ORDER[:-1], sqlite_where=TASK_PENDING)
+
+
 class InventoryCheck(db.Model):
     """盘点记录表"""
     __tablename__ = 'inventory_checks'
@@ -262,4 +344,261 @@ class InventoryCheck(db.Model):
         }
     
     def __repr__(self):
-        return f'<InventoryCheck {self.id} - Diff: {self.difference}>'
\ No newline at end of file
+        return f'<InventoryCheck {self.id} - Diff: {self.difference}>'
+
+class DailyMovement(db.Model):
+    """每日出入库汇总表（按天、按铝板累计，由入库登记和出库审批实时维护）"""
+    __tablename__ = 'daily_movements'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'plate_id', name='uq_daily_movements_day_plate'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    plate_id = db.Column(db.Integer, db.ForeignKey('aluminum_plates.id'), nullable=False, index=True)
+    inbound_quantity = db.Column(db.Integer, nullable=False, default=0)
+    outbound_quantity = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'day': self.day.isoformat() if self.day else None,
+            'plate_id': self.plate_id,
+            'inbound_quantity': self.inbound_quantity,
+            'outbound_quantity': self.outbound_quantity
+        }
+    
+    def __repr__(self):
+        return f'<DailyMovement {self.day} - {self.plate_id}>'
+
+
+class StockWarningEvent(db.Model):
+    """库存预警变化事件表（库存进入或脱离低库存状态时由触发器写入）"""
+    __tablename__ = 'stock_warning_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_id = db.Column(db.Integer, db.ForeignKey('inventories.id'), nullable=False)
+    plate_id = db.Column(db.Integer, nullable=False)
+    is_low = db.Column(db.Boolean, nullable=False)  # True: 进入低库存  False: 恢复正常
+    quantity = db.Column(db.Integer, nullable=False)
+    warning_threshold = db.Column(db.Integer)
+    occurred_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'inventory_id': self.inventory_id,
+            'plate_id': self.plate_id,
+            'is_low': self.is_low,
+            'quantity': self.quantity,
+            'warning_threshold': self.warning_threshold,
+            'occurred_at': self.occurred_at.isoformat() if self.occurred_at else None
+        }
+    
+    def __repr__(self):
+        return f'<StockWarningEvent {self.inventory_id} - {self.is_low}>'
+
+
+class ChangeLog(db.Model):
+    """变更序列表（库存、出库记录、调度任务的增删改由触发器写入，每个实体只保留最新一条）"""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.UniqueConstraint('entity', 'entity_id', name='uq_change_log_entity'),
+        {'sqlite_autoincrement': True},  # 序号单调递增，删除后不复用
+    )
+    
+    seq = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # inventory/outbound/task
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    
+    def __repr__(self):
+        return f'<ChangeLog {self.seq} - {self.entity}:{self.entity_id}>'
+
+
+class TableVersion(db.Model):
+    """数据表版本号（表中任意行增删改时由触发器递增，用于生成 ETag）"""
+    __tablename__ = 'table_versions'
+    
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime)  # UTC
+    
+    def __repr__(self):
+        return f'<TableVersion {self.table_name} - {self.version}>'
+
+
+class Job(db.Model):
+    """后台任务表（导出、报表等耗时任务，由后台线程领取执行）"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_created', 'status', 'created_at'),
+    )
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 十六进制
+    kind = db.Column(db.String(50), nullable=False)  # inbound_export/inventory_report
+    params = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued/running/succeeded/failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    processed = db.Column(db.Integer, nullable=False, default=0)  # 已处理行数
+    total = db.Column(db.Integer)  # 总行数，未知时为空
+    result_path = db.Column(db.String(500))
+    result_name = db.Column(db.String(200))
+    result_mimetype = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=get_beijing_time)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # 执行中定期更新，长时间未更新视为中断
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, index=True)  # 结果文件保留到期时间
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': json.loads(self.params) if self.params else {},
+            'status': self.status,
+            'progress': self.progress,
+            'processed': self.processed,
+            'total': self.total,
+            'result_name': self.result_name,
+            'download_url': f'/api/jobs/{self.id}/download' if self.status == 'succeeded' else None,
+            'error': self.error,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+    
+    def __repr__(self):
+        return f'<Job {self.id} - {self.kind} {self.status}>'
+
+
+class StocktakeSession(db.Model):
+    """盘点批次表（开启时快照库存数量，分批提交实盘数，关闭时统一核对入账）"""
+    __tablename__ = 'stocktake_sessions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='open', index=True)  # open/closed
+    plate_id = db.Column(db.Integer, db.ForeignKey('aluminum_plates.id'))  # 盘点范围：铝板，空表示全部
+    location = db.Column(db.String(200))  # 盘点范围：库位（含下级），空表示全部
+    line_count = db.Column(db.Integer, nullable=False, default=0)  # 快照的库存批次数
+    counted_count = db.Column(db.Integer, nullable=False, default=0)  # 关闭时已盘批次数
+    discrepancy_count = db.Column(db.Integer, nullable=False, default=0)  # 关闭时有差异的批次数
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=get_beijing_time)
+    closed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    closed_at = db.Column(db.DateTime)
+    remark = db.Column(db.Text)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'plate_id': self.plate_id,
+            'location': self.location,
+            'line_count': self.line_count,
+            'counted_count': self.counted_count,
+            'discrepancy_count': self.discrepancy_count,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'closed_by': self.closed_by,
+            'closed_at': self.closed_at.isoformat() if self.closed_at else None,
+            'remark': self.remark
+        }
+    
+    def __repr__(self):
+        return f'<StocktakeSession {self.id} - {self.status}>'
+
+
+class StocktakeLine(db.Model):
+    """盘点明细表（每个库存批次一行）"""
+    __tablename__ = 'stocktake_lines'
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'inventory_id', name='uq_stocktake_lines_session_inventory'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('stocktake_sessions.id'), nullable=False)
+    inventory_id = db.Column(db.Integer, db.ForeignKey('inventories.id'), nullable=False)
+    expected_quantity = db.Column(db.Integer, nullable=False)  # 开启时的账面数量
+    counted_quantity = db.Column(db.Integer)  # 实盘数量，未盘为空
+    counted_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    counted_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'inventory_id': self.inventory_id,
+            'expected_quantity': self.expected_quantity,
+            'counted_quantity': self.counted_quantity,
+            'difference': None if self.counted_quantity is None
+            else self.counted_quantity - self.expected_quantity,
+            'counted_by': self.counted_by,
+            'counted_at': self.counted_at.isoformat() if self.counted_at else None
+        }
+    
+    def __repr__(self):
+        return f'<StocktakeLine {self.session_id} - {self.inventory_id}>'
+
+
+class StockLedgerEntry(db.Model):
+    """库存台账（只追加，库存数量每次变化时由触发器在同一事务中写入）"""
+    __tablename__ = 'stock_ledger'
+    __table_args__ = (
+        {'sqlite_autoincrement': True},  # ID单调递增，作为快照的台账位置
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_id = db.Column(db.Integer, nullable=False)  # 批次删除后台账保留，不设外键
+    plate_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)  # 数量变化量
+    quantity_after = db.Column(db.Integer, nullable=False)  # 变化后的数量
+    occurred_at = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'inventory_id': self.inventory_id,
+            'plate_id': self.plate_id,
+            'delta': self.delta,
+            'quantity_after': self.quantity_after,
+            'occurred_at': self.occurred_at.isoformat() if self.occurred_at else None
+        }
+    
+    def __repr__(self):
+        return f'<StockLedgerEntry {self.id} - {self.inventory_id} {self.delta:+d}>'
+
+
+class StockSnapshot(db.Model):
+    """库存快照（定期记录各批次数量及对应的台账位置）"""
+    __tablename__ = 'stock_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    taken_at = db.Column(db.DateTime, nullable=False, index=True)
+    ledger_seq = db.Column(db.Integer, nullable=False)  # 快照包含的最后一条台账ID
+    
+    def __repr__(self):
+        return f'<StockSnapshot {self.id} - {self.taken_at}>'
+
+
+class StockSnapshotItem(db.Model):
+    """库存快照明细（每个批次一行）"""
+    __tablename__ = 'stock_snapshot_items'
+    
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('stock_snapshots.id'), primary_key=True)
+    inventory_id = db.Column(db.Integer, primary_key=True)
+    plate_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<StockSnapshotItem {self.snapshot_id} - {self.inventory_id}>'
@@ -1,57 +1,15 @@
 """
 认证路由蓝图
 """
-import jwt
-import datetime
-from flask import Blueprint, request, jsonify, current_app
-from functools import wraps
+from flask import Blueprint, request, jsonify
 from app import db
 from app.models import User
+from app.utils.auth import generate_token, invalidate_user, token_required
+from app.utils.passwords import HasherBusyError, needs_rehash
 
 auth_bp = Blueprint('auth', __name__)
 
 
-def generate_token(user_id):
-    """生成JWT Token"""
-    payload = {
-        'user_id': user_id,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(days=7),
-        'iat': datetime.datetime.utcnow()
-    }
-    token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
-    return token
-
-
-def token_required(f):
-    """Token验证装饰器"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        auth_header = request.headers.get('Authorization')
-        
-        if auth_header:
-            try:
-                token = auth_header.split(' ')[1]
-            except IndexError:
-                return jsonify({'error': 'Token格式错误'}), 401
-        
-        if not token:
-            return jsonify({'error': '缺少Token'}), 401
-        
-        try:
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(payload['user_id'])
-            if not current_user:
-                return jsonify({'error': '用户不存在'}), 401
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token已过期'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': '无效的Token'}), 401
-        
-        return f(current_user, *args, **kwargs)
-    return decorated
-
-
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """用户登录"""
@@ -62,12 +20,20 @@ def login():
     
     user = User.query.filter_by(username=data['username']).first()
     
-    if not user or not user.check_password(data['password']):
-        return jsonify({'error': '用户名或密码错误'}), 401
+    try:
+        if not user or not user.check_password(data['password']):
+            return jsonify({'error': '用户名或密码错误'}), 401
+    except HasherBusyError as e:
+        return jsonify({'error': str(e)}), 503
     
     if user.status != 'active':
         return jsonify({'error': '账户已被禁用'}), 403
     
+    # 哈希参数调整后，旧密码在下次登录成功时按新参数重新哈希
+    if needs_rehash(user.password_hash):
+        user.set_password(data['password'])
+        db.session.commit()
+    
     token = generate_token(user.id)
     
     return jsonify({
@@ -183,6 +149,7 @@ def update_user(current_user, user_id):
         user.set_password(data['password'])
     
     db.session.commit()
+    invalidate_user(user_id)
     
     return jsonify({
         'message': '更新成功',
@@ -220,6 +187,7 @@ def delete_user(current_user, user_id):
     
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id)
     
     return jsonify({'message': '删除成功'}), 200
 
@@ -238,6 +206,7 @@ def reset_password(current_user, user_id):
     new_password = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
     user.set_password(new_password)
     db.session.commit()
+    invalidate_user(user_id)
     
     return jsonify({'password': new_password}), 200
 
@@ -259,5 +228,6 @@ def update_user_status(current_user, user_id):
     
     user.status = status
     db.session.commit()
+    invalidate_user(user_id)
     
     return jsonify(user.to_dict()), 200
\ No newline at end of file
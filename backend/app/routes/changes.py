@@ -0,0 +1,24 @@
+"""
+增量同步路由蓝图
+"""
+from flask import Blueprint, request, jsonify
+from app.utils.changes import collect_changes
+
+changes_bp = Blueprint('changes', __name__)
+
+
+@changes_bp.route('', methods=['GET'])
+def get_changes():
+    """
+    获取库存、出库记录、调度任务在序号 since 之后的变更
+    客户端保存返回的 next_since，下次以此为 since 拉取；has_more 为 true 时继续拉取
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', 500, type=int)
+
+    if since < 0:
+        return jsonify({'error': 'since 不能为负数'}), 400
+
+    limit = max(1, min(limit, 1000))
+
+    return jsonify(collect_changes(since, limit)), 200
@@ -1,11 +1,24 @@
 """
 入库管理路由蓝图
 """
-from io import BytesIO
-from flask import Blueprint, request, jsonify, send_file
-from sqlalchemy import and_, or_
+import tempfile
+from datetime import datetime
+from urllib.parse import quote
+from flask import (
+    Blueprint, Response, current_app, jsonify, request, send_file, stream_with_context
+)
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import InboundRecord, Inventory, AluminumPlate, User
+from app.utils.inbound_export import (
+    XLSX_MIMETYPE, build_export_query, iter_csv, iter_export_rows, write_xlsx
+)
+from app.utils.locations import resolve_locations
+from app.utils.operators import resolve_operators
+from app.utils.overview import invalidate_overview
+from app.utils.pagination import keyset_paginate
+from app.utils.rollups import record_movement
+from app.utils.search import search_condition
 from app.utils.time_utils import get_beijing_time
 
 inbound_bp = Blueprint('inbound', __name__)
@@ -33,23 +46,10 @@ def create_inbound():
     if not plate:
         return jsonify({'error': '铝板不存在'}), 404
     
-    operator = User.query.filter(
-        or_(
-            User.real_name == operator_name,
-            User.username == operator_name
-        )
-    ).first()
-    
-    if not operator:
-        operator = User(
-            username=operator_name.lower().replace(' ', '_'),
-            real_name=operator_name,
-            role='warehouse',
-            status='active'
-        )
-        operator.set_password('123456')
-        db.session.add(operator)
-        db.session.flush()
+    try:
+        operator_id = resolve_operators({operator_name})[operator_name]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
         inbound_record = InboundRecord(
@@ -57,7 +57,7 @@ def create_inbound():
             quantity=quantity,
             batch_number=batch_number,
             supplier=supplier,
-            operator_id=operator.id,
+            operator_id=operator_id,
             inbound_time=get_beijing_time(),
             remark=remark
         )
@@ -75,16 +75,21 @@ def create_inbound():
             inventory.quantity += quantity
             inventory.last_updated = get_beijing_time()
         else:
+            location = data.get('location')
             inventory = Inventory(
                 plate_id=plate_id,
                 quantity=quantity,
                 batch_number=batch_number,
-                location=data.get('location'),
+                location=location,
+                location_id=resolve_locations([location]).get(location),
                 warning_threshold=data.get('warning_threshold', 10)
             )
             db.session.add(inventory)
         
+        record_movement(plate_id, inbound_record.inbound_time, inbound_quantity=quantity)
+        
         db.session.commit()
+        invalidate_overview()
         
         result = inbound_record.to_dict()
         result['operator'] = operator_name
@@ -100,11 +105,176 @@ def create_inbound():
         return jsonify({'error': f'入库登记失败: {str(e)}'}), 500
 
 
+def _is_int(value):
+    """JSON 整数（排除 true/false）"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+@inbound_bp.route('/batch', methods=['POST'])
+def create_inbound_batch():
+    """
+    批量入库登记
+
+    请求体为入库明细数组（或 {"lines": [...]}），每行字段与单条入库登记相同。
+    铝板、操作员、已有库存批次均按集合一次查出，同一铝板同一批次的多行合并更新库存，
+    所有有效行在一个事务中提交；无效行跳过并在结果中说明原因。
+    """
+    data = request.get_json()
+    lines = data.get('lines') if isinstance(data, dict) else data
+    
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'error': '入库明细不能为空'}), 400
+    
+    max_lines = current_app.config['INBOUND_BATCH_MAX_LINES']
+    if len(lines) > max_lines:
+        return jsonify({'error': f'单次最多登记 {max_lines} 行'}), 400
+    
+    results = [None] * len(lines)
+    valid = []
+    for index, line in enumerate(lines):
+        if not isinstance(line, dict) or not line.get('plate_id') or not line.get('quantity'):
+            results[index] = {'index': index, 'success': False, 'error': '铝板ID和入库数量不能为空'}
+        elif not _is_int(line['plate_id']):
+            results[index] = {'index': index, 'success': False, 'error': '铝板ID必须是整数'}
+        elif not _is_int(line['quantity']) or line['quantity'] <= 0:
+            results[index] = {'index': index, 'success': False, 'error': '入库数量必须是大于0的整数'}
+        else:
+            valid.append((index, line))
+    
+    plate_ids = {line['plate_id'] for _, line in valid}
+    plates = {
+        plate.id: plate
+        for plate in AluminumPlate.query.filter(AluminumPlate.id.in_(plate_ids))
+    }
+    
+    lines_to_save = []
+    for index, line in valid:
+        if line['plate_id'] in plates:
+            lines_to_save.append((index, line))
+        else:
+            results[index] = {'index': index, 'success': False, 'error': '铝板不存在'}
+    
+    if not lines_to_save:
+        return jsonify({
+            'message': '没有可登记的入库明细',
+            'success_count': 0,
+            'failed_count': len(lines),
+            'results': results
+        }), 400
+    
+    try:
+        operators = resolve_operators(
+            {line.get('operator_name', '未知操作员') for _, line in lines_to_save}
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        # 一次载入操作员，序列化入库记录时不再逐条查询
+        operator_users = User.query.filter(User.id.in_(set(operators.values()))).all()
+        
+        batch_keys = {
+            (line['plate_id'], line['batch_number'])
+            for _, line in lines_to_save if line.get('batch_number')
+        }
+        inventories = {}
+        if batch_keys:
+            existing = Inventory.query.filter(
+                Inventory.plate_id.in_({plate_id for plate_id, _ in batch_keys}),
+                Inventory.batch_number.in_({batch for _, batch in batch_keys})
+            ).order_by(Inventory.id)
+            for inventory in existing:
+                inventories.setdefault((inventory.plate_id, inventory.batch_number), inventory)
+        
+        locations = resolve_locations(
+            {line['location'] for _, line in lines_to_save if line.get('location')}
+        )
+        
+        now = get_beijing_time()
+        saved = []
+        plate_totals = {}
+        for index, line in lines_to_save:
+            plate_id = line['plate_id']
+            quantity = line['quantity']
+            batch_number = line.get('batch_number')
+            
+            record = InboundRecord(
+                plate_id=plate_id,
+                quantity=quantity,
+                batch_number=batch_number,
+                supplier=line.get('supplier'),
+                operator_id=operators[line.get('operator_name', '未知操作员')],
+                inbound_time=now,
+                remark=line.get('remark')
+            )
+            db.session.add(record)
+            
+            inventory = inventories.get((plate_id, batch_number)) if batch_number else None
+            if inventory:
+                inventory.quantity += quantity
+                inventory.last_updated = now
+            else:
+                inventory = Inventory(
+                    plate_id=plate_id,
+                    quantity=quantity,
+                    batch_number=batch_number,
+                    location=line.get('location'),
+                    location_id=locations.get(line.get('location')),
+                    warning_threshold=line.get('warning_threshold', 10),
+                    last_updated=now
+                )
+                db.session.add(inventory)
+                if batch_number:
+                    inventories[(plate_id, batch_number)] = inventory
+            
+            plate_totals[plate_id] = plate_totals.get(plate_id, 0) + quantity
+            saved.append((index, record, inventory))
+        
+        for plate_id, quantity in plate_totals.items():
+            record_movement(plate_id, now, inbound_quantity=quantity)
+        
+        db.session.flush()
+        
+        for index, record, inventory in saved:
+            results[index] = {
+                'index': index,
+                'success': True,
+                'inbound_record': record.to_dict(),
+                'inventory_id': inventory.id
+            }
+        
+        db.session.commit()
+        invalidate_overview()
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'批量入库登记失败: {str(e)}'}), 500
+    
+    return jsonify({
+        'message': '批量入库登记完成',
+        'success_count': len(saved),
+        'failed_count': len(lines) - len(saved),
+        'results': results
+    }), 201
+
+
+def _inbound_list_item(record):
+    """入库记录列表项"""
+    record_dict = record.to_dict()
+    if record.operator:
+        record_dict['operator_name'] = record.operator.real_name
+    return record_dict
+
+
 @inbound_bp.route('', methods=['GET'])
 def get_inbound_list():
-    """获取入库记录列表（支持分页、时间范围筛选、铝板型号筛选）"""
+    """获取入库记录列表（支持分页、时间范围筛选、铝板型号筛选）
+
+    传入 cursor 参数时使用游标分页（首页传空值），响应中返回 next_cursor 而不返回 total
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    cursor = request.args.get('cursor')
     
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
@@ -112,7 +282,10 @@ def get_inbound_list():
     batch_number = request.args.get('batch_number')
     supplier = request.args.get('supplier')
     
-    query = InboundRecord.query
+    query = InboundRecord.query.options(
+        joinedload(InboundRecord.plate),
+        joinedload(InboundRecord.operator)
+    )
     
     if start_date:
         try:
@@ -129,28 +302,37 @@ def get_inbound_list():
             return jsonify({'error': '结束时间格式错误'}), 400
     
     if plate_model:
-        query = query.join(AluminumPlate).filter(
-            AluminumPlate.model.ilike(f'%{plate_model}%')
-        )
+        query = query.filter(InboundRecord.plate_id.in_(
+            db.session.query(AluminumPlate.id).filter(
+                search_condition([AluminumPlate.model], plate_model)
+            )
+        ))
     
     if batch_number:
-        query = query.filter(InboundRecord.batch_number.ilike(f'%{batch_number}%'))
+        query = query.filter(search_condition([InboundRecord.batch_number], batch_number))
     
     if supplier:
-        query = query.filter(InboundRecord.supplier.ilike(f'%{supplier}%'))
+        query = query.filter(search_condition([InboundRecord.supplier], supplier))
+    
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_paginate(
+                query, InboundRecord.inbound_time, InboundRecord.id, cursor, per_page
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'list': [_inbound_list_item(record) for record in items],
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }), 200
     
     query = query.order_by(InboundRecord.inbound_time.desc())
     
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    records = []
-    for record in pagination.items:
-        record_dict = record.to_dict()
-        if record.plate:
-            record_dict['plate'] = record.plate.to_dict()
-        if record.operator:
-            record_dict['operator_name'] = record.operator.real_name
-        records.append(record_dict)
+    records = [_inbound_list_item(record) for record in pagination.items]
     
     return jsonify({
         'list': records,
@@ -164,7 +346,10 @@ def get_inbound_list():
 @inbound_bp.route('/<int:inbound_id>', methods=['GET'])
 def get_inbound_detail(inbound_id):
     """获取入库记录详情"""
-    inbound_record = InboundRecord.query.get(inbound_id)
+    inbound_record = InboundRecord.query.options(
+        joinedload(InboundRecord.plate),
+        joinedload(InboundRecord.operator)
+    ).get(inbound_id)
     
     if not inbound_record:
         return jsonify({'error': '入库记录不存在'}), 404
@@ -176,93 +361,48 @@ def get_inbound_detail(inbound_id):
 
 @inbound_bp.route('/export', methods=['GET'])
 def export_inbound():
-    """导出入库记录为Excel文件"""
+    """
+    导出入库记录
+
+    format=xlsx（默认）使用 openpyxl 只写模式写入临时文件后分块发送，
+    format=csv 边查询边输出
+    """
     try:
-        import openpyxl
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+        import openpyxl  # noqa: F401
     except ImportError:
         return jsonify({'error': '缺少openpyxl库，请先安装: pip install openpyxl'}), 500
     
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    plate_model = request.args.get('plate_model')
-    
-    query = InboundRecord.query
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in ['xlsx', 'csv']:
+        return jsonify({'error': 'format 参数必须是 xlsx 或 csv'}), 400
     
-    if start_date:
-        try:
-            start_datetime = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            query = query.filter(InboundRecord.inbound_time >= start_datetime)
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_datetime = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            query = query.filter(InboundRecord.inbound_time <= end_datetime)
-        except ValueError:
-            pass
-    
-    if plate_model:
-        query = query.join(AluminumPlate).filter(
-            AluminumPlate.model.ilike(f'%{plate_model}%')
-        )
-    
-    records = query.order_by(InboundRecord.inbound_time.desc()).all()
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = '入库记录'
-    
-    header_font = Font(bold=True, size=12)
-    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-    header_font_white = Font(bold=True, size=12, color='FFFFFF')
-    header_alignment = Alignment(horizontal='center', vertical='center')
-    
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    query = build_export_query(
+        start_date=request.args.get('start_date'),
+        end_date=request.args.get('end_date'),
+        plate_model=request.args.get('plate_model')
     )
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    filename = f'入库记录_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{export_format}'
     
-    headers = ['序号', '铝板型号', '铝板规格', '入库数量', '单位', '批次号', 
-               '供应商', '操作员', '入库时间', '备注']
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=header)
-        cell.font = header_font_white
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-    
-    for row_num, record in enumerate(records, 2):
-        ws.cell(row=row_num, column=1, value=row_num - 1).border = thin_border
-        ws.cell(row=row_num, column=2, value=record.plate.model if record.plate else '').border = thin_border
-        ws.cell(row=row_num, column=3, value=record.plate.specification if record.plate else '').border = thin_border
-        ws.cell(row=row_num, column=4, value=record.quantity).border = thin_border
-        ws.cell(row=row_num, column=5, value=record.plate.unit if record.plate else '').border = thin_border
-        ws.cell(row=row_num, column=6, value=record.batch_number or '').border = thin_border
-        ws.cell(row=row_num, column=7, value=record.supplier or '').border = thin_border
-        ws.cell(row=row_num, column=8, value=record.operator.real_name if record.operator else '').border = thin_border
-        
-        inbound_time = record.inbound_time.strftime('%Y-%m-%d %H:%M:%S') if record.inbound_time else ''
-        ws.cell(row=row_num, column=9, value=inbound_time).border = thin_border
-        ws.cell(row=row_num, column=10, value=record.remark or '').border = thin_border
-    
-    column_widths = [8, 15, 20, 12, 8, 15, 20, 12, 20, 30]
-    for col_num, width in enumerate(column_widths, 1):
-        ws.column_dimensions[openpyxl.utils.get_column_letter(col_num)].width = width
+    if export_format == 'csv':
+        response = Response(
+            stream_with_context(iter_csv(iter_export_rows(query, chunk_size))),
+            mimetype='text/csv'
+        )
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+        return response
     
-    output = BytesIO()
-    wb.save(output)
+    output = tempfile.TemporaryFile()
+    try:
+        write_xlsx(iter_export_rows(query, chunk_size), output)
+    except Exception:
+        output.close()
+        raise
     output.seek(0)
     
-    filename = f'入库记录_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
     return send_file(
         output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        mimetype=XLSX_MIMETYPE,
         as_attachment=True,
         download_name=filename
-    )
\ No newline at end of file
+    )
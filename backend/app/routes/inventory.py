@@ -1,37 +1,63 @@
 """
 库存管理路由蓝图
 """
-from flask import Blueprint, request, jsonify
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from sqlalchemy.orm import contains_eager, joinedload
 from app import db
-from app.models import Inventory, InventoryCheck, AluminumPlate
+from app.models import Inventory, InventoryCheck, AluminumPlate, StocktakeSession, StocktakeLine
+from app.utils.auth import token_required
+from app.utils.ledger import quantities_as_of
+from app.utils.locations import find_location
+from app.utils.low_stock import iter_event_stream, latest_event_id
+from app.utils.overview import invalidate_overview
+from app.utils.pagination import keyset_paginate
+from app.utils.search import search_condition
+from app.utils.stocktake import close_session, open_session, parse_counts, submit_counts
+from app.utils.versions import conditional_get
 
 inventory_bp = Blueprint('inventory', __name__)
 
 
 @inventory_bp.route('', methods=['GET'])
+@conditional_get('inventories', 'aluminum_plates')
 def get_inventories():
     """
     获取库存列表
-    支持分页、搜索、筛选低库存
+    支持分页、搜索、筛选低库存，传入 cursor 参数时使用游标分页
     """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '').strip()
     low_stock = request.args.get('low_stock', '').lower() == 'true'
 
-    query = Inventory.query.join(AluminumPlate)
+    query = Inventory.query.join(AluminumPlate).options(contains_eager(Inventory.plate))
 
     if search:
         query = query.filter(
             db.or_(
-                AluminumPlate.model.contains(search),
-                AluminumPlate.specification.contains(search),
-                Inventory.batch_number.contains(search)
+                search_condition([AluminumPlate.model, AluminumPlate.specification], search),
+                search_condition([Inventory.batch_number], search)
             )
         )
 
     if low_stock:
-        query = query.filter(Inventory.quantity <= Inventory.warning_threshold)
+        query = query.filter(Inventory.is_low == db.true())
+
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_paginate(
+                query, Inventory.last_updated, Inventory.id, cursor, per_page
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({
+            'list': [inventory.to_dict() for inventory in items],
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }), 200
 
     pagination = query.order_by(Inventory.last_updated.desc()).paginate(
         page=page, per_page=per_page, error_out=False
@@ -47,9 +73,10 @@ def get_inventories():
 
 
 @inventory_bp.route('/<int:inventory_id>', methods=['GET'])
+@conditional_get('inventories', 'aluminum_plates')
 def get_inventory(inventory_id):
     """获取库存详情"""
-    inventory = Inventory.query.get(inventory_id)
+    inventory = Inventory.query.options(joinedload(Inventory.plate)).get(inventory_id)
 
     if not inventory:
         return jsonify({'error': '库存记录不存在'}), 404
@@ -57,15 +84,77 @@ def get_inventory(inventory_id):
     return jsonify({'inventory': inventory.to_dict()}), 200
 
 
+@inventory_bp.route('/as-of', methods=['GET'])
+@conditional_get('inventories', 'aluminum_plates')
+def get_inventory_as_of():
+    """
+    查询某日结束时的库存数量（按库存台账计算）
+    date: YYYY-MM-DD，plate_id 可选
+    """
+    date_str = request.args.get('date')
+    plate_id = request.args.get('plate_id', type=int)
+    
+    if not date_str:
+        return jsonify({'error': '请提供日期'}), 400
+    
+    try:
+        day = datetime.strptime(date_str, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': '日期格式错误，应为YYYY-MM-DD'}), 400
+    
+    snapshot, rows = quantities_as_of(day + timedelta(days=1), plate_id=plate_id)
+    if snapshot is None:
+        return jsonify({'error': '该日期早于库存台账的起始时间'}), 400
+    
+    batches = {
+        inventory_id: (batch_number, location)
+        for inventory_id, batch_number, location in db.session.query(
+            Inventory.id, Inventory.batch_number, Inventory.location
+        ).filter(Inventory.id.in_([row[0] for row in rows]))
+    }
+    plates = {
+        plate.id: plate for plate in AluminumPlate.query.filter(
+            AluminumPlate.id.in_({row[1] for row in rows})
+        )
+    }
+    
+    items = []
+    plate_totals = {}
+    for inventory_id, row_plate_id, quantity in rows:
+        batch_number, location = batches.get(inventory_id, (None, None))
+        plate = plates.get(row_plate_id)
+        items.append({
+            'inventory_id': inventory_id,
+            'plate_id': row_plate_id,
+            'plateCode': plate.model if plate else None,
+            'specification': plate.specification if plate else None,
+            'batchNumber': batch_number,
+            'location': location,
+            'quantity': quantity
+        })
+        plate_totals[row_plate_id] = plate_totals.get(row_plate_id, 0) + quantity
+    
+    return jsonify({
+        'date': date_str,
+        'snapshot_taken_at': snapshot.taken_at.isoformat(),
+        'items': items,
+        'plates': [
+            {'plate_id': key, 'quantity': value} for key, value in sorted(plate_totals.items())
+        ],
+        'total_quantity': sum(plate_totals.values())
+    }), 200
+
+
 @inventory_bp.route('/warnings', methods=['GET'])
+@conditional_get('inventories', 'aluminum_plates')
 def get_inventory_warnings():
     """获取库存预警列表"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
 
     query = Inventory.query.filter(
-        Inventory.quantity <= Inventory.warning_threshold
-    ).join(AluminumPlate)
+        Inventory.is_low == db.true()
+    ).join(AluminumPlate).options(contains_eager(Inventory.plate))
 
     pagination = query.order_by(Inventory.quantity.asc()).paginate(
         page=page, per_page=per_page, error_out=False
@@ -80,6 +169,32 @@ def get_inventory_warnings():
     }), 200
 
 
+@inventory_bp.route('/warnings/stream', methods=['GET'])
+def stream_inventory_warnings():
+    """
+    推送库存预警变化（Server-Sent Events）
+    只在库存进入低库存（low_stock）或恢复正常（restocked）时推送，
+    断线重连时浏览器携带 Last-Event-ID 续传，也可通过 last_event_id 参数指定起点
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        after_id = int(last_event_id) if last_event_id else latest_event_id()
+    except ValueError:
+        return jsonify({'error': '事件ID格式错误'}), 400
+    db.session.remove()
+
+    stream = iter_event_stream(
+        after_id,
+        current_app.config['STOCK_EVENTS_POLL_INTERVAL'],
+        current_app.config['STOCK_EVENTS_STREAM_TIMEOUT']
+    )
+    return Response(
+        stream_with_context(stream),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @inventory_bp.route('/check', methods=['POST'])
 def create_inventory_check():
     """创建盘点记录"""
@@ -93,6 +208,10 @@ def create_inventory_check():
         return jsonify({'error': '库存记录不存在'}), 404
 
     actual_quantity = int(data['actual_quantity'])
+    if actual_quantity < inventory.reserved_quantity:
+        return jsonify({
+            'error': f'实际数量低于待审批出库占用数量 {inventory.reserved_quantity}，请先审批或驳回相关出库申请'
+        }), 409
     expected_quantity = inventory.quantity
     difference = actual_quantity - expected_quantity
 
@@ -112,6 +231,7 @@ def create_inventory_check():
     inventory.quantity = actual_quantity
 
     db.session.commit()
+    invalidate_overview()
 
     return jsonify({
         'message': '盘点记录创建成功',
@@ -121,13 +241,17 @@ def create_inventory_check():
 
 @inventory_bp.route('/checks', methods=['GET'])
 def get_inventory_checks():
-    """获取盘点记录列表"""
+    """获取盘点记录列表（传入 cursor 参数时使用游标分页）"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    cursor = request.args.get('cursor')
     inventory_id = request.args.get('inventory_id', type=int)
     checker_id = request.args.get('checker_id', type=int)
 
-    query = InventoryCheck.query
+    query = InventoryCheck.query.options(
+        joinedload(InventoryCheck.inventory).joinedload(Inventory.plate),
+        joinedload(InventoryCheck.checker)
+    )
 
     if inventory_id:
         query = query.filter_by(inventory_id=inventory_id)
@@ -135,6 +259,20 @@ def get_inventory_checks():
     if checker_id:
         query = query.filter_by(checker_id=checker_id)
 
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_paginate(
+                query, InventoryCheck.check_time, InventoryCheck.id, cursor, per_page
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({
+            'checks': [check.to_dict() for check in items],
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }), 200
+
     pagination = query.order_by(InventoryCheck.check_time.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
@@ -145,4 +283,178 @@ def get_inventory_checks():
         'page': page,
         'per_page': per_page,
         'pages': pagination.pages
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+@inventory_bp.route('/stocktakes', methods=['POST'])
+@token_required
+def create_stocktake(current_user):
+    """
+    开启盘点，快照范围内库存批次的账面数量
+    可按 plate_id、location（库位，如 WH1-Z1，包含其全部下级库位）限定范围，不传时盘点全部库存
+    """
+    data = request.get_json(silent=True) or {}
+    
+    plate_id = data.get('plate_id')
+    if plate_id is not None and not AluminumPlate.query.get(plate_id):
+        return jsonify({'error': '铝板不存在'}), 404
+    
+    location = (data.get('location') or '').strip() or None
+    if location and not find_location(location):
+        return jsonify({'error': '库位不存在'}), 404
+    
+    session = open_session(
+        current_user.id,
+        plate_id=plate_id,
+        location=location,
+        remark=data.get('remark')
+    )
+    
+    return jsonify({
+        'message': '盘点已开启',
+        'stocktake': session.to_dict()
+    }), 201
+
+
+@inventory_bp.route('/stocktakes', methods=['GET'])
+def get_stocktakes():
+    """获取盘点批次列表"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    status = request.args.get('status')
+    
+    query = StocktakeSession.query
+    if status:
+        query = query.filter_by(status=status)
+    
+    pagination = query.order_by(StocktakeSession.id.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
+    return jsonify({
+        'stocktakes': [session.to_dict() for session in pagination.items],
+        'total': pagination.total,
+        'page': page,
+        'per_page': per_page,
+        'pages': pagination.pages
+    }), 200
+
+
+@inventory_bp.route('/stocktakes/<int:session_id>', methods=['GET'])
+def get_stocktake(session_id):
+    """获取盘点批次详情及进度"""
+    session = StocktakeSession.query.get(session_id)
+    if not session:
+        return jsonify({'error': '盘点不存在'}), 404
+    
+    result = session.to_dict()
+    if session.status == 'open':
+        counted, discrepancies = db.session.query(
+            db.func.count(StocktakeLine.counted_quantity),
+            db.func.count(StocktakeLine.id).filter(
+                StocktakeLine.counted_quantity != StocktakeLine.expected_quantity
+            )
+        ).filter(StocktakeLine.session_id == session_id).one()
+        result['counted_count'] = counted
+        result['discrepancy_count'] = discrepancies
+    
+    return jsonify(result), 200
+
+
+@inventory_bp.route('/stocktakes/<int:session_id>/lines', methods=['GET'])
+def get_stocktake_lines(session_id):
+    """
+    获取盘点明细（游标分页）
+    status: uncounted（未盘）、counted（已盘）、discrepancy（有差异）
+    """
+    per_page = request.args.get('per_page', 100, type=int)
+    cursor = request.args.get('cursor')
+    status = request.args.get('status')
+    
+    query = StocktakeLine.query.filter(StocktakeLine.session_id == session_id)
+    if status == 'uncounted':
+        query = query.filter(StocktakeLine.counted_quantity.is_(None))
+    elif status == 'counted':
+        query = query.filter(StocktakeLine.counted_quantity.isnot(None))
+    elif status == 'discrepancy':
+        query = query.filter(StocktakeLine.counted_quantity != StocktakeLine.expected_quantity)
+    elif status:
+        return jsonify({'error': 'status 参数必须是 uncounted、counted 或 discrepancy'}), 400
+    
+    try:
+        items, next_cursor = keyset_paginate(
+            query, StocktakeLine.id, StocktakeLine.id, cursor, per_page
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'lines': [line.to_dict() for line in items],
+        'next_cursor': next_cursor,
+        'per_page': per_page
+    }), 200
+
+
+@inventory_bp.route('/stocktakes/<int:session_id>/counts', methods=['POST'])
+@token_required
+def submit_stocktake_counts(current_user, session_id):
+    """
+    批量提交实盘数
+    counts: [{inventory_id, actual_quantity}, ...]，可多次提交，同一批次以最后一次为准
+    """
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': '实盘数不能为空'}), 400
+    
+    try:
+        counts = parse_counts(data.get('counts'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    max_counts = current_app.config['STOCKTAKE_MAX_COUNTS']
+    if len(counts) > max_counts:
+        return jsonify({'error': f'单次最多提交{max_counts}行'}), 400
+    
+    session = StocktakeSession.query.get(session_id)
+    if not session:
+        return jsonify({'error': '盘点不存在'}), 404
+    if session.status != 'open':
+        return jsonify({'error': '盘点已关闭'}), 409
+    
+    applied, unknown = submit_counts(session_id, counts, current_user.id)
+    if unknown:
+        return jsonify({
+            'error': '部分库存批次不在本次盘点范围内',
+            'inventory_ids': unknown
+        }), 400
+    if not applied:
+        return jsonify({'error': '盘点已关闭'}), 409
+    
+    return jsonify({
+        'message': '实盘数已提交',
+        'submitted': len(counts)
+    }), 200
+
+
+@inventory_bp.route('/stocktakes/<int:session_id>/close', methods=['PUT'])
+@token_required
+def close_stocktake(current_user, session_id):
+    """关闭盘点：生成盘点记录并按差异调整库存，未盘的批次保持不变"""
+    session, conflicts = close_session(session_id, current_user.id)
+    if conflicts:
+        return jsonify({
+            'error': '部分批次的实盘数低于待审批出库占用数量，请先审批或驳回相关出库申请',
+            'conflicts': conflicts
+        }), 409
+    if session is None:
+        if not StocktakeSession.query.get(session_id):
+            return jsonify({'error': '盘点不存在'}), 404
+        return jsonify({'error': '盘点已关闭'}), 409
+    
+    invalidate_overview()
+    
+    return jsonify({
+        'message': '盘点已完成',
+        'stocktake': session.to_dict()
+    }), 200
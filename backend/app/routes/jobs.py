@@ -0,0 +1,83 @@
+"""
+后台任务路由蓝图
+"""
+import os
+from flask import Blueprint, current_app, request, jsonify, send_file
+from app.models import Job
+from app.utils.auth import token_required
+from app.utils.jobs import active_job_count, normalize_params, submit_job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def _get_visible_job(current_user, job_id):
+    """任务只对提交人和管理员可见"""
+    job = Job.query.get(job_id)
+    if job is None or (job.created_by != current_user.id and current_user.role != 'admin'):
+        return None
+    return job
+
+
+@jobs_bp.route('', methods=['POST'])
+@token_required
+def create_job(current_user):
+    """
+    提交后台任务
+    kind: inbound_export（参数 format/start_date/end_date/plate_model）或 inventory_report（参数 format）
+    """
+    data = request.get_json()
+
+    if not data or not data.get('kind'):
+        return jsonify({'error': '任务类型不能为空'}), 400
+
+    try:
+        params = normalize_params(data['kind'], data.get('params') or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = current_app.config['JOBS_MAX_ACTIVE_PER_USER']
+    if active_job_count(current_user.id) >= limit:
+        return jsonify({'error': f'同时进行中的任务不能超过 {limit} 个，请等待已有任务完成'}), 429
+
+    job = submit_job(data['kind'], params, current_user.id)
+
+    response = jsonify({
+        'message': '任务已提交',
+        'job': job.to_dict()
+    })
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@token_required
+def get_job(current_user, job_id):
+    """查询任务状态和进度"""
+    job = _get_visible_job(current_user, job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    return jsonify({'job': job.to_dict()}), 200
+
+
+@jobs_bp.route('/<job_id>/download', methods=['GET'])
+@token_required
+def download_job_result(current_user, job_id):
+    """下载任务结果文件"""
+    job = _get_visible_job(current_user, job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    if job.status != 'succeeded':
+        return jsonify({'error': f'任务尚未完成，当前状态: {job.status}'}), 409
+
+    if not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({'error': '结果文件已过期或被清理'}), 410
+
+    return send_file(
+        job.result_path,
+        mimetype=job.result_mimetype,
+        as_attachment=True,
+        download_name=job.result_name
+    )
@@ -2,10 +2,18 @@
 出库管理路由蓝图
 """
 from datetime import datetime
-from flask import Blueprint, request, jsonify, make_response
-from sqlalchemy import and_
+from flask import Blueprint, current_app, request, jsonify, make_response
+from sqlalchemy import and_, case, update
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import OutboundRecord, Inventory, User, DispatchTask, AluminumPlate
+from app.utils.pagination import keyset_paginate
+from app.utils.overview import invalidate_overview
+from app.utils.rollups import record_movement
+from app.utils.stock import (
+    allocation_lines, available_quantity, consume_stock, consume_stock_batch,
+    release_reservation, release_reservations, reserve_stock
+)
 from app.utils.time_utils import get_beijing_time
 
 outbound_bp = Blueprint('outbound', __name__)
@@ -43,13 +51,9 @@ def create_outbound():
     if not applicant:
         applicant = User.query.first()
     
-    inventory = Inventory.query.filter_by(plate_id=plate_id).first()
-    if not inventory:
+    if not Inventory.query.filter_by(plate_id=plate_id).first():
         return jsonify({'error': '该铝板库存不存在'}), 404
     
-    if inventory.quantity < quantity:
-        return jsonify({'error': f'库存不足，当前库存: {inventory.quantity}'}), 400
-    
     plate = AluminumPlate.query.get(plate_id)
     plate_info = f"{plate.model} - {plate.specification}" if plate else f"铝板ID:{plate_id}"
     
@@ -64,6 +68,12 @@ def create_outbound():
     db.session.add(outbound)
     db.session.flush()
     
+    # 按入库时间先进先出，可跨多个批次预留
+    allocations = reserve_stock(outbound)
+    if not allocations:
+        db.session.rollback()
+        return jsonify({'error': f'库存不足，当前可用库存: {available_quantity(plate_id)}'}), 400
+    
     admin_user = User.query.filter_by(role='admin').first()
     
     task = DispatchTask(
@@ -78,18 +88,25 @@ def create_outbound():
     
     db.session.add(task)
     db.session.commit()
+    invalidate_overview()
     
     return jsonify({
         'message': '出库申请创建成功',
-        'outbound': outbound.to_dict()
+        'outbound': outbound.to_dict(),
+        'allocations': _allocations_to_dict(allocations)
     }), 201
 
 
+def _allocations_to_dict(lines):
+    return [{'inventory_id': inventory_id, 'quantity': quantity} for inventory_id, quantity in lines]
+
+
 @outbound_bp.route('', methods=['GET'])
 def get_outbounds():
-    """获取出库记录列表"""
+    """获取出库记录列表（传入 cursor 参数时使用游标分页）"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    cursor = request.args.get('cursor')
     
     status = request.args.get('status')
     start_date = request.args.get('start_date')
@@ -97,7 +114,11 @@ def get_outbounds():
     plate_id = request.args.get('plate_id', type=int)
     applicant_id = request.args.get('applicant_id', type=int)
     
-    query = OutboundRecord.query
+    query = OutboundRecord.query.options(
+        joinedload(OutboundRecord.plate),
+        joinedload(OutboundRecord.applicant),
+        joinedload(OutboundRecord.approver)
+    )
     
     if status:
         query = query.filter(OutboundRecord.status == status)
@@ -122,6 +143,20 @@ def get_outbounds():
         except ValueError:
             return jsonify({'error': '结束日期格式错误'}), 400
     
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_paginate(
+                query, OutboundRecord.id, OutboundRecord.id, cursor, per_page
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'outbounds': [outbound.to_dict() for outbound in items],
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }), 200
+    
     query = query.order_by(OutboundRecord.id.desc())
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
@@ -137,29 +172,213 @@ def get_outbounds():
 @outbound_bp.route('/<int:outbound_id>', methods=['GET'])
 def get_outbound(outbound_id):
     """获取出库记录详情"""
-    outbound = OutboundRecord.query.get(outbound_id)
+    outbound = OutboundRecord.query.options(
+        joinedload(OutboundRecord.plate),
+        joinedload(OutboundRecord.applicant),
+        joinedload(OutboundRecord.approver)
+    ).get(outbound_id)
     
     if not outbound:
         return jsonify({'error': '出库记录不存在'}), 404
     
-    return jsonify({'outbound': outbound.to_dict()}), 200
+    return jsonify({
+        'outbound': outbound.to_dict(),
+        'allocations': _allocations_to_dict(allocation_lines(outbound_id))
+    }), 200
 
 
-@outbound_bp.route('/<int:outbound_id>/approve', methods=['PUT'])
-def approve_outbound(outbound_id):
-    """审核通过出库申请"""
-    data = request.get_json()
-    
-    approver_id = data.get('approver_id') if data else None
+def _claim_pending(outbound_id, **values):
+    """仅当申请仍为待审批时更新其状态，返回是否更新成功（防止重复审批）"""
+    return outbound_id in _claim_pending_many([outbound_id], **values)
+
+
+def _claim_pending_many(outbound_ids, **values):
+    """一条 UPDATE 更新仍为待审批的申请，返回实际更新的申请ID集合"""
+    result = db.session.execute(
+        update(OutboundRecord)
+        .where(OutboundRecord.id.in_(outbound_ids), OutboundRecord.status == 'pending')
+        .values(**values)
+        .returning(OutboundRecord.id)
+        .execution_options(synchronize_session=False)
+    )
+    return {outbound_id for (outbound_id,) in result}
+
+
+def _resolve_approver(data):
+    """审批人：请求中的 approver_id，未指定或无效时为第一个管理员"""
+    approver_id = data.get('approver_id') if isinstance(data, dict) else None
     
     if approver_id:
         try:
-            approver_id = int(approver_id)
-            approver = User.query.get(approver_id)
+            return User.query.get(int(approver_id))
         except (ValueError, TypeError):
-            approver = User.query.filter_by(role='admin').first()
-    else:
-        approver = User.query.filter_by(role='admin').first()
+            pass
+    return User.query.filter_by(role='admin').first()
+
+
+def _parse_batch_ids(data):
+    """
+    解析批量审批的申请ID列表，重复的ID只保留第一次出现
+    
+    Returns:
+        (ID列表, 错误信息)
+    """
+    ids = data.get('ids') if isinstance(data, dict) else data
+    if not isinstance(ids, list) or not ids:
+        return None, '出库申请ID列表不能为空'
+    
+    max_ids = current_app.config['OUTBOUND_BATCH_MAX_IDS']
+    if len(ids) > max_ids:
+        return None, f'单次最多审批 {max_ids} 条申请'
+    
+    try:
+        return list(dict.fromkeys(int(outbound_id) for outbound_id in ids)), None
+    except (ValueError, TypeError):
+        return None, '出库申请ID必须是整数'
+
+
+def _claim_batch(ids, **values):
+    """
+    领取批量审批中仍为待审批的申请
+    
+    Returns:
+        (按ID排序的已领取申请列表, {申请ID: 失败结果})
+    """
+    records = {
+        outbound.id: outbound
+        for outbound in OutboundRecord.query.filter(OutboundRecord.id.in_(ids))
+    }
+    failures = {}
+    pending_ids = []
+    for outbound_id in ids:
+        outbound = records.get(outbound_id)
+        if outbound is None:
+            failures[outbound_id] = '出库记录不存在'
+        elif outbound.status != 'pending':
+            failures[outbound_id] = f'该出库申请已处理，当前状态: {outbound.status}'
+        else:
+            pending_ids.append(outbound_id)
+    
+    claimed = _claim_pending_many(pending_ids, **values) if pending_ids else set()
+    for outbound_id in pending_ids:
+        if outbound_id not in claimed:
+            failures[outbound_id] = '该出库申请已被其他审批人处理'
+    
+    return [records[outbound_id] for outbound_id in sorted(claimed)], failures
+
+
+def _batch_response(message, ids, succeeded, failures):
+    """批量审批结果，results 与请求中的ID顺序一致"""
+    results = []
+    for outbound_id in ids:
+        if outbound_id in succeeded:
+            results.append({'id': outbound_id, 'success': True, **succeeded[outbound_id]})
+        else:
+            results.append({'id': outbound_id, 'success': False, 'error': failures[outbound_id]})
+    
+    return jsonify({
+        'message': message,
+        'success_count': len(succeeded),
+        'failed_count': len(ids) - len(succeeded),
+        'results': results
+    }), 200
+
+
+@outbound_bp.route('/batch/approve', methods=['PUT'])
+def batch_approve_outbound():
+    """
+    批量审核通过出库申请
+    
+    请求体为 {"ids": [...], "approver_id": ...}。审批人只解析一次，申请用一条 UPDATE 领取，
+    库存按批次、按铝板汇总后一次检查并扣减，全部在一个事务中提交；
+    库存不足的申请保持待审批，并在结果中说明原因。
+    """
+    data = request.get_json()
+    ids, error = _parse_batch_ids(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    approver = _resolve_approver(data)
+    outbound_time = get_beijing_time()
+    outbounds, failures = _claim_batch(
+        ids, status='approved',
+        approver_id=approver.id if approver else 1,
+        outbound_time=outbound_time
+    )
+    
+    consumed = consume_stock_batch(outbounds)
+    
+    short = [outbound.id for outbound in outbounds if not consumed[outbound.id]]
+    if short:
+        db.session.execute(
+            update(OutboundRecord)
+            .where(OutboundRecord.id.in_(short))
+            .values(status='pending', approver_id=None, outbound_time=None)
+            .execution_options(synchronize_session=False)
+        )
+        for outbound_id in short:
+            failures[outbound_id] = '库存不足'
+    
+    succeeded = {}
+    plate_totals = {}
+    for outbound in outbounds:
+        lines = consumed[outbound.id]
+        if lines:
+            succeeded[outbound.id] = {'status': 'approved', 'allocations': _allocations_to_dict(lines)}
+            plate_totals[outbound.plate_id] = plate_totals.get(outbound.plate_id, 0) + outbound.quantity
+    
+    for plate_id, quantity in plate_totals.items():
+        record_movement(plate_id, outbound_time, outbound_quantity=quantity)
+    
+    db.session.commit()
+    if succeeded:
+        invalidate_overview()
+    
+    return _batch_response('批量审核完成', ids, succeeded, failures)
+
+
+@outbound_bp.route('/batch/reject', methods=['PUT'])
+def batch_reject_outbound():
+    """
+    批量审核拒绝出库申请
+    
+    请求体为 {"ids": [...], "approver_id": ..., "reason": ...}。申请用一条 UPDATE 领取并追加拒绝原因，
+    预留数量按批次汇总后一次释放，全部在一个事务中提交。
+    """
+    data = request.get_json()
+    ids, error = _parse_batch_ids(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    approver = _resolve_approver(data)
+    values = {'status': 'rejected', 'approver_id': approver.id if approver else 1}
+    
+    reason = data.get('reason') if isinstance(data, dict) else None
+    if reason:
+        note = f'拒绝原因: {reason}'
+        values['remark'] = case(
+            (OutboundRecord.remark.is_(None), note),
+            (OutboundRecord.remark == '', note),
+            else_=OutboundRecord.remark + '\n' + note
+        )
+    
+    outbounds, failures = _claim_batch(ids, **values)
+    if outbounds:
+        release_reservations(outbounds)
+    
+    db.session.commit()
+    if outbounds:
+        invalidate_overview()
+    
+    succeeded = {outbound.id: {'status': 'rejected'} for outbound in outbounds}
+    return _batch_response('批量拒绝完成', ids, succeeded, failures)
+
+
+@outbound_bp.route('/<int:outbound_id>/approve', methods=['PUT'])
+def approve_outbound(outbound_id):
+    """审核通过出库申请"""
+    data = request.get_json()
+    approver = _resolve_approver(data)
     
     outbound = OutboundRecord.query.get(outbound_id)
     if not outbound:
@@ -168,26 +387,35 @@ def approve_outbound(outbound_id):
     if outbound.status != 'pending':
         return jsonify({'error': f'该出库申请已处理，当前状态: {outbound.status}'}), 400
     
-    inventory = Inventory.query.filter_by(plate_id=outbound.plate_id).first()
-    if not inventory:
+    if not Inventory.query.filter_by(plate_id=outbound.plate_id).first():
         return jsonify({'error': '该铝板库存不存在'}), 404
     
-    if inventory.quantity < outbound.quantity:
-        return jsonify({'error': f'库存不足，当前库存: {inventory.quantity}'}), 400
+    outbound_time = get_beijing_time()
+    if not _claim_pending(outbound_id, status='approved',
+                          approver_id=approver.id if approver else 1,
+                          outbound_time=outbound_time):
+        db.session.rollback()
+        return jsonify({'error': '该出库申请已被其他审批人处理'}), 400
     
-    outbound.status = 'approved'
-    outbound.approver_id = approver.id if approver else 1
-    outbound.outbound_time = get_beijing_time()
+    allocations = consume_stock(outbound)
+    if not allocations:
+        db.session.rollback()
+        return jsonify({
+            'error': f'库存不足，当前可用库存: {available_quantity(outbound.plate_id)}'
+        }), 400
     
-    inventory.quantity -= outbound.quantity
-    inventory.last_updated = get_beijing_time()
+    record_movement(outbound.plate_id, outbound_time, outbound_quantity=outbound.quantity)
     
     db.session.commit()
+    invalidate_overview()
+    
+    inventory = Inventory.query.get(allocations[0][0])
     
     return jsonify({
         'message': '出库申请审核通过',
         'outbound': outbound.to_dict(),
-        'inventory': inventory.to_dict()
+        'inventory': inventory.to_dict(),
+        'allocations': _allocations_to_dict(allocations)
     }), 200
 
 
@@ -195,17 +423,7 @@ def approve_outbound(outbound_id):
 def reject_outbound(outbound_id):
     """审核拒绝出库申请"""
     data = request.get_json()
-    
-    approver_id = data.get('approver_id') if data else None
-    
-    if approver_id:
-        try:
-            approver_id = int(approver_id)
-            approver = User.query.get(approver_id)
-        except (ValueError, TypeError):
-            approver = User.query.filter_by(role='admin').first()
-    else:
-        approver = User.query.filter_by(role='admin').first()
+    approver = _resolve_approver(data)
     
     outbound = OutboundRecord.query.get(outbound_id)
     if not outbound:
@@ -214,8 +432,12 @@ def reject_outbound(outbound_id):
     if outbound.status != 'pending':
         return jsonify({'error': f'该出库申请已处理，当前状态: {outbound.status}'}), 400
     
-    outbound.status = 'rejected'
-    outbound.approver_id = approver.id if approver else 1
+    if not _claim_pending(outbound_id, status='rejected',
+                          approver_id=approver.id if approver else 1):
+        db.session.rollback()
+        return jsonify({'error': '该出库申请已被其他审批人处理'}), 400
+    
+    release_reservation(outbound)
     
     if data and data.get('reason'):
         if outbound.remark:
@@ -224,6 +446,7 @@ def reject_outbound(outbound_id):
             outbound.remark = f'拒绝原因: {data["reason"]}'
     
     db.session.commit()
+    invalidate_overview()
     
     return jsonify({
         'message': '出库申请已拒绝',
@@ -1,51 +1,23 @@
 """
 铝板信息管理路由蓝图
 """
-import jwt
-from flask import Blueprint, request, jsonify, current_app
-from functools import wraps
+from flask import Blueprint, request, jsonify
 from app import db
-from app.models import AluminumPlate, User
+from app.models import AluminumPlate
+from app.utils.auth import token_required
+from app.utils.search import search_condition
+from app.utils.versions import conditional_get
 
 plates_bp = Blueprint('plates', __name__)
 
 
-def token_required(f):
-    """Token验证装饰器"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        auth_header = request.headers.get('Authorization')
-        
-        if auth_header:
-            try:
-                token = auth_header.split(' ')[1]
-            except IndexError:
-                return jsonify({'error': 'Token格式错误'}), 401
-        
-        if not token:
-            return jsonify({'error': '缺少Token'}), 401
-        
-        try:
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(payload['user_id'])
-            if not current_user:
-                return jsonify({'error': '用户不存在'}), 401
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token已过期'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': '无效的Token'}), 401
-        
-        return f(current_user, *args, **kwargs)
-    return decorated
-
-
 def check_permission(user_role):
     """检查用户权限"""
     return user_role in ['admin', 'warehouse']
 
 
 @plates_bp.route('', methods=['GET'])
+@conditional_get('aluminum_plates')
 def get_plates():
     """获取铝板列表"""
     page = request.args.get('page', 1, type=int)
@@ -55,14 +27,9 @@ def get_plates():
     query = AluminumPlate.query
 
     if search:
-        search_pattern = f'%{search}%'
-        query = query.filter(
-            db.or_(
-                AluminumPlate.model.ilike(search_pattern),
-                AluminumPlate.specification.ilike(search_pattern),
-                AluminumPlate.supplier.ilike(search_pattern)
-            )
-        )
+        query = query.filter(search_condition(
+            [AluminumPlate.model, AluminumPlate.specification, AluminumPlate.supplier], search
+        ))
 
     pagination = query.order_by(AluminumPlate.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
@@ -78,6 +45,7 @@ def get_plates():
 
 
 @plates_bp.route('/<int:plate_id>', methods=['GET'])
+@conditional_get('aluminum_plates')
 def get_plate(plate_id):
     """获取铝板详情"""
     plate = AluminumPlate.query.get(plate_id)
@@ -7,66 +7,30 @@ from sqlalchemy import func, and_, or_
 from app import db
 from app.models import (
     User, AluminumPlate, Inventory, 
-    InboundRecord, OutboundRecord, 
-    DispatchTask, InventoryCheck
+    InventoryCheck, DailyMovement, Location
 )
+from app.utils.locations import child_rollups, find_location, location_totals
+from app.utils.overview import OVERVIEW_TABLES, get_overview_counters, get_overview_versions
 from app.utils.time_utils import get_beijing_time
+from app.utils.versions import conditional_get
 
 statistics_bp = Blueprint('statistics', __name__)
 
 
 @statistics_bp.route('/overview', methods=['GET'])
+@conditional_get(
+    *OVERVIEW_TABLES, extra=lambda: get_beijing_time().date(), versions=get_overview_versions
+)
 def get_overview():
     """获取统计概览"""
     try:
-        now = get_beijing_time()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        total_inventory = db.session.query(
-            func.sum(Inventory.quantity)
-        ).scalar() or 0
-        
-        today_inbound = db.session.query(
-            func.sum(InboundRecord.quantity)
-        ).filter(
-            InboundRecord.inbound_time >= today_start
-        ).scalar() or 0
-        
-        today_outbound = db.session.query(
-            func.sum(OutboundRecord.quantity)
-        ).filter(
-            and_(
-                OutboundRecord.outbound_time >= today_start,
-                OutboundRecord.status == 'approved'
-            )
-        ).scalar() or 0
-        
-        pending_outbound = OutboundRecord.query.filter_by(
-            status='pending'
-        ).count()
-        
-        low_stock_warning = db.session.query(Inventory).filter(
-            Inventory.quantity <= Inventory.warning_threshold
-        ).count()
-        
-        pending_tasks = DispatchTask.query.filter(
-            DispatchTask.status.in_(['pending', 'in_progress'])
-        ).count()
-        
-        return jsonify({
-            'total_inventory': total_inventory,
-            'today_inbound': today_inbound,
-            'today_outbound': today_outbound,
-            'pending_outbound': pending_outbound,
-            'low_stock_warning': low_stock_warning,
-            'pending_tasks': pending_tasks
-        }), 200
-        
+        return jsonify(get_overview_counters()), 200
     except Exception as e:
         return jsonify({'error': f'获取统计概览失败: {str(e)}'}), 500
 
 
 @statistics_bp.route('/inventory', methods=['GET'])
+@conditional_get('inventories', 'aluminum_plates')
 def get_inventory_statistics():
     """获取库存统计"""
     try:
@@ -91,21 +55,24 @@ def get_inventory_statistics():
             })
         
         by_location = db.session.query(
-            Inventory.location,
+            Location,
             func.sum(Inventory.quantity).label('total_quantity'),
             func.count(Inventory.id).label('batch_count')
-        ).filter(
-            Inventory.location.isnot(None)
+        ).join(
+            Inventory, Inventory.location_id == Location.id
         ).group_by(
-            Inventory.location
+            Location.id
+        ).order_by(
+            Location.path
         ).all()
         
         location_stats = []
-        for item in by_location:
+        for location, total_quantity, batch_count in by_location:
             location_stats.append({
-                'location': item.location,
-                'total_quantity': item.total_quantity or 0,
-                'batch_count': item.batch_count
+                'location': location.label,
+                'location_id': location.id,
+                'total_quantity': total_quantity or 0,
+                'batch_count': batch_count
             })
         
         return jsonify({
@@ -117,9 +84,40 @@ def get_inventory_statistics():
         return jsonify({'error': f'获取库存统计失败: {str(e)}'}), 500
 
 
+@statistics_bp.route('/locations', methods=['GET'])
+@conditional_get('inventories', 'locations')
+def get_location_statistics():
+    """
+    按库位层级汇总库存
+    parent: 上级库位（如 WH1、WH1-Z1），返回其下一级各库位的汇总；不传时返回各仓库
+    """
+    parent_text = request.args.get('parent', '').strip()
+    
+    parent = None
+    if parent_text:
+        parent = find_location(parent_text)
+        if not parent:
+            return jsonify({'error': '库位不存在'}), 404
+    
+    children = []
+    for location, total_quantity, batch_count in child_rollups(parent):
+        item = location.to_dict()
+        item['total_quantity'] = total_quantity
+        item['batch_count'] = batch_count
+        children.append(item)
+    
+    result = {'parent': None, 'locations': children}
+    if parent:
+        total_quantity, batch_count = location_totals(parent)
+        result['parent'] = dict(parent.to_dict(), total_quantity=total_quantity, batch_count=batch_count)
+    
+    return jsonify(result), 200
+
+
 @statistics_bp.route('/trend', methods=['GET'])
+@conditional_get('daily_movements')
 def get_trend():
-    """获取出入库趋势"""
+    """获取出入库趋势（读取每日汇总表）"""
     try:
         start_date_str = request.args.get('start_date')
         end_date_str = request.args.get('end_date')
@@ -139,64 +137,37 @@ def get_trend():
             return jsonify({'error': '开始日期不能晚于结束日期'}), 400
         
         if group_by == 'day':
-            date_format = func.strftime('%Y-%m-%d', InboundRecord.inbound_time)
-            date_format_out = func.strftime('%Y-%m-%d', OutboundRecord.outbound_time)
+            period = func.strftime('%Y-%m-%d', DailyMovement.day)
         elif group_by == 'week':
-            date_format = func.strftime('%Y-%W', InboundRecord.inbound_time)
-            date_format_out = func.strftime('%Y-%W', OutboundRecord.outbound_time)
+            period = func.strftime('%Y-%W', DailyMovement.day)
         elif group_by == 'month':
-            date_format = func.strftime('%Y-%m', InboundRecord.inbound_time)
-            date_format_out = func.strftime('%Y-%m', OutboundRecord.outbound_time)
+            period = func.strftime('%Y-%m', DailyMovement.day)
         else:
             return jsonify({'error': 'group_by 参数必须是 day、week 或 month'}), 400
         
-        inbound_trend = db.session.query(
-            date_format.label('period'),
-            func.sum(InboundRecord.quantity).label('inbound_quantity')
+        rows = db.session.query(
+            period.label('period'),
+            func.sum(DailyMovement.inbound_quantity).label('inbound_quantity'),
+            func.sum(DailyMovement.outbound_quantity).label('outbound_quantity')
         ).filter(
             and_(
-                InboundRecord.inbound_time >= start_date,
-                InboundRecord.inbound_time <= end_date
+                DailyMovement.day >= start_date.date(),
+                DailyMovement.day <= end_date.date()
             )
         ).group_by(
             'period'
-        ).all()
-        
-        outbound_trend = db.session.query(
-            date_format_out.label('period'),
-            func.sum(OutboundRecord.quantity).label('outbound_quantity')
-        ).filter(
-            and_(
-                OutboundRecord.outbound_time >= start_date,
-                OutboundRecord.outbound_time <= end_date,
-                OutboundRecord.status == 'approved'
-            )
-        ).group_by(
+        ).order_by(
             'period'
         ).all()
         
-        trend_dict = {}
-        
-        for item in inbound_trend:
-            if item.period:
-                trend_dict[item.period] = {
-                    'period': item.period,
-                    'inbound_quantity': item.inbound_quantity or 0,
-                    'outbound_quantity': 0
-                }
-        
-        for item in outbound_trend:
-            if item.period:
-                if item.period in trend_dict:
-                    trend_dict[item.period]['outbound_quantity'] = item.outbound_quantity or 0
-                else:
-                    trend_dict[item.period] = {
-                        'period': item.period,
-                        'inbound_quantity': 0,
-                        'outbound_quantity': item.outbound_quantity or 0
-                    }
-        
-        trends = sorted(trend_dict.values(), key=lambda x: x['period'])
+        trends = [
+            {
+                'period': item.period,
+                'inbound_quantity': item.inbound_quantity or 0,
+                'outbound_quantity': item.outbound_quantity or 0
+            }
+            for item in rows if item.period
+        ]
         
         return jsonify({
             'trends': trends,
@@ -3,8 +3,13 @@
 """
 from datetime import datetime
 from flask import Blueprint, request, jsonify
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
 from app import db
-from app.models import DispatchTask, User
+from app.models import DispatchTask, User, TASK_CLAIM_ORDER, TASK_PENDING
+from app.utils.auth import token_required
+from app.utils.overview import invalidate_overview
+from app.utils.pagination import keyset_paginate
 from app.utils.time_utils import get_beijing_time
 
 tasks_bp = Blueprint('tasks', __name__)
@@ -49,6 +54,7 @@ def create_task():
     
     db.session.add(task)
     db.session.commit()
+    invalidate_overview()
     
     return jsonify({
         'message': '任务创建成功',
@@ -58,13 +64,17 @@ def create_task():
 
 @tasks_bp.route('', methods=['GET'])
 def get_tasks():
-    """获取任务列表"""
+    """获取任务列表（传入 cursor 参数时使用游标分页）"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    cursor = request.args.get('cursor')
     
     per_page = min(per_page, 100)
     
-    query = DispatchTask.query
+    query = DispatchTask.query.options(
+        joinedload(DispatchTask.assignee),
+        joinedload(DispatchTask.creator)
+    )
     
     status = request.args.get('status')
     if status:
@@ -86,6 +96,20 @@ def get_tasks():
     if creator_id:
         query = query.filter_by(creator_id=creator_id)
     
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_paginate(
+                query, DispatchTask.created_at, DispatchTask.id, cursor, per_page
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'tasks': [task.to_dict() for task in items],
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }), 200
+    
     query = query.order_by(DispatchTask.created_at.desc())
     
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
@@ -99,10 +123,63 @@ def get_tasks():
     }), 200
 
 
+def _claim_next_task(assignee_id):
+    """
+    在一条 UPDATE 中选出执行人领取顺序最靠前的待处理任务并置为进行中
+
+    子查询与更新在同一语句中执行，多个终端同时领取时同一任务只会被领取一次。
+
+    Returns:
+        领取到的任务ID，没有待处理任务时返回 None
+    """
+    candidate = select(DispatchTask.id).where(
+        DispatchTask.assignee_id == assignee_id,
+        TASK_PENDING
+    ).order_by(*TASK_CLAIM_ORDER).limit(1).correlate(None).scalar_subquery()
+    
+    result = db.session.execute(
+        update(DispatchTask)
+        .where(DispatchTask.id == candidate, TASK_PENDING)
+        .values(status='in_progress')
+        .returning(DispatchTask.id)
+        .execution_options(synchronize_session=False)
+    )
+    task_id = result.scalar()
+    db.session.commit()
+    return task_id
+
+
+@tasks_bp.route('/claim', methods=['POST'])
+@token_required
+def claim_task(current_user):
+    """
+    领取下一个任务
+    从分配给当前用户的待处理任务中按优先级（高/中/低）、截止时间（早的在前，无截止时间的最后）
+    取最靠前的一个，置为进行中后返回
+    """
+    task_id = _claim_next_task(current_user.id)
+    if task_id is None:
+        return jsonify({'message': '没有待处理的任务', 'task': None}), 200
+    
+    invalidate_overview()
+    task = DispatchTask.query.options(
+        joinedload(DispatchTask.assignee),
+        joinedload(DispatchTask.creator)
+    ).get(task_id)
+    
+    return jsonify({
+        'message': '任务领取成功',
+        'task': task.to_dict()
+    }), 200
+
+
 @tasks_bp.route('/<int:task_id>', methods=['GET'])
 def get_task(task_id):
     """获取任务详情"""
-    task = DispatchTask.query.get(task_id)
+    task = DispatchTask.query.options(
+        joinedload(DispatchTask.assignee),
+        joinedload(DispatchTask.creator)
+    ).get(task_id)
     
     if not task:
         return jsonify({'error': '任务不存在'}), 404
@@ -176,6 +253,7 @@ def update_task_status(task_id):
         task.completed_at = None
     
     db.session.commit()
+    invalidate_overview()
     
     return jsonify({
         'message': '任务状态更新成功',
@@ -220,5 +298,6 @@ def delete_task(task_id):
     
     db.session.delete(task)
     db.session.commit()
+    invalidate_overview()
     
     return jsonify({'message': '任务删除成功'}), 200
\ No newline at end of file
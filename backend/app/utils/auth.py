@@ -0,0 +1,93 @@
+"""
+认证工具
+
+token_required 解码JWT后从进程内缓存（app.extensions['user_cache']）读取用户快照，
+缓存未命中时才查询users表；修改用户信息的接口提交后需调用 invalidate_user()。
+"""
+import datetime
+import jwt
+from functools import wraps
+from flask import request, jsonify, current_app
+from app.models import User
+from app.utils.operators import invalidate_operators
+
+
+class Principal:
+    """已认证用户的只读快照"""
+
+    __slots__ = ('id', 'username', 'real_name', 'role', 'status', '_data')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.real_name = user.real_name
+        self.role = user.role
+        self.status = user.status
+        self._data = user.to_dict()
+
+    def to_dict(self):
+        """转换为字典（与 User.to_dict 一致）"""
+        return dict(self._data)
+
+    def __repr__(self):
+        return f'<Principal {self.username}>'
+
+
+def generate_token(user_id):
+    """生成JWT Token"""
+    payload = {
+        'user_id': user_id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(days=7),
+        'iat': datetime.datetime.utcnow()
+    }
+    token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+    return token
+
+
+def load_principal(user_id):
+    """按用户ID获取用户快照，优先读取缓存；用户不存在时返回 None"""
+    cache = current_app.extensions['user_cache']
+    principal = cache.get(user_id)
+    if principal is None:
+        user = User.query.get(user_id)
+        if not user:
+            return None
+        principal = Principal(user)
+        cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_user(user_id):
+    """使用户快照缓存和操作员名称缓存失效，在修改或删除用户后调用"""
+    current_app.extensions['user_cache'].pop(user_id)
+    invalidate_operators()
+
+
+def token_required(f):
+    """Token验证装饰器，将当前用户快照作为第一个参数传入视图"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = None
+        auth_header = request.headers.get('Authorization')
+        
+        if auth_header:
+            try:
+                token = auth_header.split(' ')[1]
+            except IndexError:
+                return jsonify({'error': 'Token格式错误'}), 401
+        
+        if not token:
+            return jsonify({'error': '缺少Token'}), 401
+        
+        try:
+            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+            current_user = load_principal(payload['user_id'])
+            if not current_user:
+                return jsonify({'error': '用户不存在'}), 401
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token已过期'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': '无效的Token'}), 401
+        
+        return f(current_user, *args, **kwargs)
+    return decorated
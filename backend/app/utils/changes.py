@@ -0,0 +1,102 @@
+"""
+增量同步变更序列
+
+库存、出库记录、调度任务的每次增删改由 SQLite 触发器写入 change_log，
+每个实体只保留最新一条（序号单调递增），客户端按上次拿到的序号拉取之后的变化。
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import ChangeLog, Inventory, OutboundRecord, DispatchTask
+
+# 表名 -> 变更序列中的实体名
+CHANGE_TABLES = {
+    'inventories': 'inventory',
+    'outbound_records': 'outbound',
+    'dispatch_tasks': 'task',
+}
+
+# 实体名 -> (模型, 序列化时需要预加载的关联)
+ENTITY_LOADERS = {
+    'inventory': (Inventory, lambda: [joinedload(Inventory.plate)]),
+    'outbound': (OutboundRecord, lambda: [
+        joinedload(OutboundRecord.plate),
+        joinedload(OutboundRecord.applicant),
+        joinedload(OutboundRecord.approver)
+    ]),
+    'task': (DispatchTask, lambda: [
+        joinedload(DispatchTask.assignee),
+        joinedload(DispatchTask.creator)
+    ]),
+}
+
+
+def _stamp(entity, row, deleted):
+    return (
+        f"DELETE FROM change_log WHERE entity = '{entity}' AND entity_id = {row}.id; "
+        f"INSERT INTO change_log (entity, entity_id, deleted) VALUES ('{entity}', {row}.id, {deleted});"
+    )
+
+
+def ensure_change_triggers():
+    """创建缺失的触发器，首次为某张表创建时把已有记录全部登记为变更"""
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+        }
+        for table_name, entity in CHANGE_TABLES.items():
+            names = {
+                f'{table_name}_changes_ai': f'AFTER INSERT ON {table_name} BEGIN {_stamp(entity, "new", 0)} END',
+                f'{table_name}_changes_au': f'AFTER UPDATE ON {table_name} BEGIN {_stamp(entity, "new", 0)} END',
+                f'{table_name}_changes_ad': f'AFTER DELETE ON {table_name} BEGIN {_stamp(entity, "old", 1)} END',
+            }
+            missing = [name for name in names if name not in existing]
+            if not missing:
+                continue
+
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO change_log (entity, entity_id, deleted) "
+                f"SELECT '{entity}', id, 0 FROM {table_name} ORDER BY id"
+            ))
+            for name in missing:
+                conn.execute(text(f'CREATE TRIGGER {name} {names[name]}'))
+
+
+def collect_changes(since, limit):
+    """
+    取出序号 since 之后的变更
+
+    Args:
+        since: 客户端上次同步到的序号，0 表示全量
+        limit: 单次最多返回的变更条数
+
+    Returns:
+        {'upserts': {实体: [记录]}, 'deletes': {实体: [id]}, 'next_since': 序号, 'has_more': bool}
+    """
+    rows = ChangeLog.query.filter(ChangeLog.seq > since).order_by(ChangeLog.seq).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    upsert_ids = {entity: [] for entity in ENTITY_LOADERS}
+    deletes = {entity: [] for entity in ENTITY_LOADERS}
+    for row in rows:
+        if row.deleted:
+            deletes[row.entity].append(row.entity_id)
+        else:
+            upsert_ids[row.entity].append(row.entity_id)
+
+    upserts = {}
+    for entity, ids in upsert_ids.items():
+        if not ids:
+            upserts[entity] = []
+            continue
+        model, options = ENTITY_LOADERS[entity]
+        records = model.query.options(*options()).filter(model.id.in_(ids)).all()
+        upserts[entity] = [record.to_dict() for record in records]
+
+    return {
+        'upserts': upserts,
+        'deletes': deletes,
+        'next_since': rows[-1].seq if rows else since,
+        'has_more': has_more
+    }
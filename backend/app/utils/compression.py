@@ -0,0 +1,58 @@
+"""
+响应压缩
+
+按请求的 Accept-Encoding 协商 br（需安装 brotli）或 gzip，
+只压缩超过 COMPRESS_MIN_SIZE 字节的文本类响应；流式响应（CSV导出、SSE）不压缩。
+"""
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+
+def _encoders(app):
+    encoders = {'gzip': lambda data: gzip.compress(data, compresslevel=app.config['COMPRESS_GZIP_LEVEL'])}
+    if brotli is not None:
+        encoders['br'] = lambda data: brotli.compress(data, quality=app.config['COMPRESS_BROTLI_QUALITY'])
+    return encoders
+
+
+def init_compression(app):
+    """注册压缩钩子，需在 init_metrics 之后调用，使指标记录压缩后的字节数"""
+    if not app.config.get('COMPRESS_ENABLED'):
+        return
+
+    encoders = _encoders(app)
+    # 同等权重时优先 br
+    preference = [name for name in ('br', 'gzip') if name in encoders]
+    mimetypes = set(app.config['COMPRESS_MIMETYPES'])
+    min_size = app.config['COMPRESS_MIN_SIZE']
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or response.status_code == 204
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in mimetypes
+        ):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(preference)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(encoders[encoding](data))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,146 @@
+"""
+入库记录导出工具
+
+按块读取入库记录（关联数据在同一条SQL中取出），通过 openpyxl 只写模式或CSV输出，
+内存占用与导出行数无关。
+"""
+import csv
+from datetime import datetime
+from io import StringIO
+from app import db
+from app.models import InboundRecord, AluminumPlate, User
+from app.utils.search import search_condition
+
+EXPORT_HEADERS = ['序号', '铝板型号', '铝板规格', '入库数量', '单位', '批次号',
+                  '供应商', '操作员', '入库时间', '备注']
+
+EXPORT_COLUMN_WIDTHS = [8, 15, 20, 12, 8, 15, 20, 12, 20, 30]
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def build_export_query(start_date=None, end_date=None, plate_model=None):
+    """
+    构建导出查询，只取导出需要的列
+
+    无法解析的日期参数会被忽略
+    """
+    query = db.session.query(
+        InboundRecord.id,
+        InboundRecord.quantity,
+        InboundRecord.batch_number,
+        InboundRecord.supplier,
+        InboundRecord.inbound_time,
+        InboundRecord.remark,
+        AluminumPlate.model,
+        AluminumPlate.specification,
+        AluminumPlate.unit,
+        User.real_name.label('operator_name')
+    ).outerjoin(
+        AluminumPlate, InboundRecord.plate_id == AluminumPlate.id
+    ).outerjoin(
+        User, InboundRecord.operator_id == User.id
+    )
+
+    start_datetime = _parse_datetime(start_date) if start_date else None
+    if start_datetime:
+        query = query.filter(InboundRecord.inbound_time >= start_datetime)
+
+    end_datetime = _parse_datetime(end_date) if end_date else None
+    if end_datetime:
+        query = query.filter(InboundRecord.inbound_time <= end_datetime)
+
+    if plate_model:
+        query = query.filter(search_condition([AluminumPlate.model], plate_model))
+
+    return query.order_by(InboundRecord.inbound_time.desc(), InboundRecord.id.desc())
+
+
+def format_export_row(index, row):
+    """将查询结果转换为导出的一行"""
+    return [
+        index,
+        row.model or '',
+        row.specification or '',
+        row.quantity,
+        row.unit or '',
+        row.batch_number or '',
+        row.supplier or '',
+        row.operator_name or '',
+        row.inbound_time.strftime('%Y-%m-%d %H:%M:%S') if row.inbound_time else '',
+        row.remark or ''
+    ]
+
+
+def iter_export_rows(query, chunk_size=1000):
+    """逐行产出导出数据，数据库游标每次取 chunk_size 行"""
+    for index, row in enumerate(query.yield_per(chunk_size), 1):
+        yield format_export_row(index, row)
+
+
+def write_xlsx(rows, fileobj, headers=EXPORT_HEADERS, column_widths=EXPORT_COLUMN_WIDTHS, title='入库记录'):
+    """使用 openpyxl 只写模式将数据写入 fileobj"""
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    for col_num, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = width
+
+    header_font_white = Font(bold=True, size=12, color='FFFFFF')
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font_white
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for row in rows:
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.border = thin_border
+            cells.append(cell)
+        ws.append(cells)
+
+    wb.save(fileobj)
+
+
+def iter_csv(rows, chunk_rows=500, headers=EXPORT_HEADERS):
+    """将数据编码为CSV文本块（带BOM，便于Excel识别UTF-8）"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue().encode('utf-8')
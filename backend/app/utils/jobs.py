@@ -0,0 +1,345 @@
+"""
+后台任务
+
+导出、报表等耗时任务写入 jobs 表后立即返回，由后台线程按提交顺序领取执行，
+结果文件写到 JOBS_RESULT_DIR，过期后连同任务记录一起清理。
+领取任务使用带条件的 UPDATE，多个进程同时运行时同一任务只会被执行一次，
+且全部进程合计同时运行的任务数不超过 JOBS_MAX_RUNNING。
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from app import db
+from app.models import Job, AluminumPlate, Inventory, InboundRecord
+from app.utils.inbound_export import (
+    EXPORT_COLUMN_WIDTHS, EXPORT_HEADERS, XLSX_MIMETYPE,
+    build_export_query, format_export_row, iter_csv, write_xlsx
+)
+from app.utils.pagination import keyset_paginate
+from app.utils.time_utils import get_beijing_time
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {'xlsx': XLSX_MIMETYPE, 'csv': 'text/csv'}
+
+INVENTORY_REPORT_HEADERS = ['铝板型号', '铝板规格', '单位', '批次数', '库存总量', '已预留', '可用数量', '低库存批次数']
+INVENTORY_REPORT_WIDTHS = [15, 20, 8, 10, 12, 12, 12, 14]
+
+
+class _ProgressReporter:
+    """更新任务进度（同时作为心跳），每次调用提交一次"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def __call__(self, processed, total=None):
+        values = {'processed': processed, 'heartbeat_at': get_beijing_time()}
+        if total is not None:
+            values['total'] = total
+            values['progress'] = min(99, processed * 100 // total) if total else 99
+        db.session.execute(
+            update(Job).where(Job.id == self.job_id).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+
+def _write_rows(rows, path, export_format, headers, column_widths, title):
+    with open(path, 'wb') as output:
+        if export_format == 'csv':
+            for chunk in iter_csv(rows, headers=headers):
+                output.write(chunk)
+        else:
+            write_xlsx(rows, output, headers=headers, column_widths=column_widths, title=title)
+
+
+def _run_inbound_export(params, path, report):
+    """入库记录导出，按 (入库时间, id) 游标分块读取，每块之后汇报进度"""
+    query = build_export_query(
+        start_date=params.get('start_date'),
+        end_date=params.get('end_date'),
+        plate_model=params.get('plate_model')
+    ).order_by(None)
+    total = query.count()
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    report(0, total)
+
+    def rows():
+        cursor = None
+        index = 0
+        while True:
+            items, cursor = keyset_paginate(
+                query, InboundRecord.inbound_time, InboundRecord.id, cursor, chunk_size
+            )
+            for row in items:
+                index += 1
+                yield format_export_row(index, row)
+            report(index, total)
+            if cursor is None:
+                return
+
+    _write_rows(rows(), path, params['format'], EXPORT_HEADERS, EXPORT_COLUMN_WIDTHS, '入库记录')
+    return '入库记录'
+
+
+def _run_inventory_report(params, path, report):
+    """按铝板汇总的库存报表"""
+    items = db.session.query(
+        AluminumPlate.model,
+        AluminumPlate.specification,
+        AluminumPlate.unit,
+        func.count(Inventory.id),
+        func.coalesce(func.sum(Inventory.quantity), 0),
+        func.coalesce(func.sum(Inventory.reserved_quantity), 0),
+        func.coalesce(func.sum(db.cast(Inventory.is_low, db.Integer)), 0)
+    ).join(
+        Inventory, AluminumPlate.id == Inventory.plate_id
+    ).group_by(
+        AluminumPlate.id
+    ).order_by(AluminumPlate.model, AluminumPlate.specification).all()
+    report(0, len(items))
+
+    rows = (
+        [model, specification, unit, batches, quantity, reserved, quantity - reserved, low_batches]
+        for model, specification, unit, batches, quantity, reserved, low_batches in items
+    )
+    _write_rows(rows, path, params['format'], INVENTORY_REPORT_HEADERS, INVENTORY_REPORT_WIDTHS, '库存报表')
+    report(len(items), len(items))
+    return '库存报表'
+
+
+# 任务类型 -> (执行函数, 允许的参数)
+JOB_KINDS = {
+    'inbound_export': (_run_inbound_export, {'format', 'start_date', 'end_date', 'plate_model'}),
+    'inventory_report': (_run_inventory_report, {'format'}),
+}
+
+
+def normalize_params(kind, params):
+    """
+    校验并规范化任务参数
+
+    Raises:
+        ValueError: 任务类型或参数不合法
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f'任务类型必须是: {", ".join(JOB_KINDS)}')
+    if not isinstance(params, dict):
+        raise ValueError('params 必须是对象')
+
+    _, allowed = JOB_KINDS[kind]
+    unknown = set(params) - allowed
+    if unknown:
+        raise ValueError(f'不支持的参数: {", ".join(sorted(unknown))}')
+
+    params = dict(params)
+    params.setdefault('format', 'xlsx')
+    if params['format'] not in EXPORT_FORMATS:
+        raise ValueError('format 参数必须是 xlsx 或 csv')
+    return params
+
+
+def active_job_count(user_id):
+    """用户排队中和执行中的任务数"""
+    return Job.query.filter(
+        Job.created_by == user_id,
+        Job.status.in_(['queued', 'running'])
+    ).count()
+
+
+def submit_job(kind, params, user_id):
+    """创建任务并通知后台线程领取"""
+    job = Job(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        params=json.dumps(params, ensure_ascii=False),
+        status='queued',
+        created_by=user_id
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    current_app.extensions['job_runner'].notify()
+    return job
+
+
+def claim_next_job(max_running):
+    """
+    领取最早提交的排队任务
+
+    Returns:
+        领取到的任务ID，没有可领取的任务或已达到并发上限时返回 None
+    """
+    while True:
+        candidate = db.session.query(Job.id).filter(
+            Job.status == 'queued'
+        ).order_by(Job.created_at).first()
+        if candidate is None:
+            return None
+
+        running = select(func.count(Job.id)).where(Job.status == 'running').scalar_subquery()
+        now = get_beijing_time()
+        result = db.session.execute(
+            update(Job)
+            .where(Job.id == candidate.id, Job.status == 'queued', running < max_running)
+            .values(status='running', started_at=now, heartbeat_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return candidate.id
+
+        # 被其他线程抢先领取时换下一个；达到并发上限时放弃本轮
+        if db.session.query(Job.id).filter(Job.status == 'running').count() >= max_running:
+            return None
+
+
+def execute_job(job_id):
+    """执行已领取的任务并记录结果"""
+    job = Job.query.get(job_id)
+    if job is None:
+        return
+    params = json.loads(job.params or '{}')
+    handler, _ = JOB_KINDS[job.kind]
+
+    result_dir = current_app.config['JOBS_RESULT_DIR']
+    os.makedirs(result_dir, exist_ok=True)
+    path = os.path.join(result_dir, f'{job.id}.{params["format"]}')
+    ttl = timedelta(seconds=current_app.config['JOBS_RESULT_TTL'])
+
+    try:
+        title = handler(params, path, _ProgressReporter(job_id))
+    except Exception as e:
+        logger.exception('后台任务执行失败: %s', job_id)
+        db.session.rollback()
+        if os.path.exists(path):
+            os.remove(path)
+        values = {'status': 'failed', 'error': str(e)}
+    else:
+        stamp = job.created_at.strftime('%Y%m%d_%H%M%S')
+        values = {
+            'status': 'succeeded',
+            'progress': 100,
+            'result_path': path,
+            'result_name': f'{title}_{stamp}.{params["format"]}',
+            'result_mimetype': EXPORT_FORMATS[params['format']]
+        }
+
+    now = get_beijing_time()
+    db.session.execute(
+        update(Job).where(Job.id == job_id)
+        .values(finished_at=now, expires_at=now + ttl, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def cleanup_jobs(stale_after):
+    """
+    删除过期任务及结果文件，并将长时间没有心跳的执行中任务标记为失败
+
+    Returns:
+        (删除的任务数, 标记为失败的任务数)
+    """
+    now = get_beijing_time()
+
+    expired = db.session.query(Job.id, Job.result_path).filter(Job.expires_at < now).all()
+    for _, result_path in expired:
+        if result_path:
+            try:
+                os.remove(result_path)
+            except FileNotFoundError:  # 其他进程已清理
+                pass
+    if expired:
+        db.session.execute(delete(Job).where(Job.id.in_([job_id for job_id, _ in expired])))
+
+    stale = db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.heartbeat_at < now - timedelta(seconds=stale_after))
+        .values(
+            status='failed',
+            error='任务执行中断（进程退出或长时间无进度）',
+            finished_at=now,
+            expires_at=now + timedelta(seconds=current_app.config['JOBS_RESULT_TTL'])
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return len(expired), stale.rowcount
+
+
+class JobRunner:
+    """后台任务线程池，首次提交任务时启动（启动时已有任务记录则立即启动以便清理）"""
+
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config['JOBS_WORKERS']
+        self.max_running = app.config['JOBS_MAX_RUNNING']
+        self.poll_interval = app.config['JOBS_POLL_INTERVAL']
+        self.cleanup_interval = app.config['JOBS_CLEANUP_INTERVAL']
+        self.stale_after = app.config['JOBS_STALE_AFTER']
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._next_cleanup = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def notify(self):
+        """有新任务提交时唤醒空闲线程"""
+        self.start()
+        self._wakeup.set()
+
+    def _cleanup_due(self):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_cleanup:
+                return False
+            self._next_cleanup = now + self.cleanup_interval
+            return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            job_id = None
+            with self.app.app_context():
+                try:
+                    if self._cleanup_due():
+                        cleanup_jobs(self.stale_after)
+                    job_id = claim_next_job(self.max_running)
+                    if job_id:
+                        execute_job(job_id)
+                except Exception:
+                    logger.exception('后台任务线程异常')
+                finally:
+                    db.session.remove()
+
+            if job_id is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+
+def init_jobs(app):
+    """创建任务执行器，需在应用上下文中调用"""
+    runner = JobRunner(app)
+    app.extensions['job_runner'] = runner
+    if db.session.query(Job.id).first() is not None:
+        runner.start()
+    db.session.remove()
@@ -0,0 +1,48 @@
+"""
+JSON 编解码
+
+安装了 orjson 时使用 orjson 编码响应（原生支持 datetime/date，直接输出UTF-8字节），
+未安装或 JSON_FAST_ENCODER = False 时与 Flask 默认实现一致。
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """优先使用 orjson 的 JSON 提供者"""
+
+    @property
+    def fast(self):
+        return orjson is not None and self._app.config.get('JSON_FAST_ENCODER', True)
+
+    def _orjson_options(self):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        # 调用方传入 json.dumps 专有参数（indent、separators 等）时交给标准库处理
+        if not self.fast or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if not self.fast or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if not self.fast:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self._orjson_options()
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        body = orjson.dumps(obj, default=self.default, option=option)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,184 @@
+"""
+库存台账与时点查询
+
+inventories.quantity 每次变化（新增、修改、删除批次）时由 SQLite 触发器在同一事务中
+向 stock_ledger 追加一条记录，入库、出库审批、盘点等写入路径无需改动。
+后台线程按 STOCK_SNAPSHOT_INTERVAL 记录各批次数量快照（期间没有变化时跳过），
+时点查询从该时点之前最近的快照出发，只叠加到下一次快照为止的台账记录。
+"""
+import logging
+import threading
+from sqlalchemy import func, select, text, union_all
+from app import db
+from app.models import StockLedgerEntry, StockSnapshot, StockSnapshotItem
+from app.utils.time_utils import BEIJING_TZ
+
+logger = logging.getLogger(__name__)
+
+# 数据库时钟的北京时间，与 get_beijing_time() 写入的时间格式可直接比较
+_OFFSET_HOURS = int(BEIJING_TZ.utcoffset(None).total_seconds() // 3600)
+_NOW = f"strftime('%Y-%m-%d %H:%M:%f', 'now', '+{_OFFSET_HOURS} hours')"
+
+
+def _entry(row, delta, quantity_after):
+    return (
+        'INSERT INTO stock_ledger (inventory_id, plate_id, delta, quantity_after, occurred_at) '
+        f'VALUES ({row}.id, {row}.plate_id, {delta}, {quantity_after}, {_NOW});'
+    )
+
+
+TRIGGERS = {
+    'inventories_ledger_ai': (
+        'AFTER INSERT ON inventories WHEN new.quantity != 0 '
+        f'BEGIN {_entry("new", "new.quantity", "new.quantity")} END'
+    ),
+    'inventories_ledger_au': (
+        'AFTER UPDATE OF quantity ON inventories WHEN new.quantity != old.quantity '
+        f'BEGIN {_entry("new", "new.quantity - old.quantity", "new.quantity")} END'
+    ),
+    'inventories_ledger_ad': (
+        'AFTER DELETE ON inventories WHEN old.quantity != 0 '
+        f'BEGIN {_entry("old", "-old.quantity", "0")} END'
+    ),
+}
+
+# 距上次快照不足 :window 或台账没有新记录时不插入
+_SNAPSHOT = text(
+    f'INSERT INTO stock_snapshots (taken_at, ledger_seq) '
+    f'SELECT {_NOW}, seq FROM (SELECT coalesce(max(id), 0) AS seq FROM stock_ledger) '
+    f'WHERE NOT EXISTS ('
+    f"SELECT 1 FROM stock_snapshots WHERE ledger_seq >= seq "
+    f"OR taken_at > strftime('%Y-%m-%d %H:%M:%f', 'now', '+{_OFFSET_HOURS} hours', :window))"
+)
+
+_SNAPSHOT_ITEMS = text(
+    'INSERT INTO stock_snapshot_items (snapshot_id, inventory_id, plate_id, quantity) '
+    'SELECT :snapshot_id, id, plate_id, quantity FROM inventories WHERE quantity != 0'
+)
+
+
+def take_snapshot(conn, min_interval=0):
+    """
+    在 conn 的事务中记录一次快照
+
+    Args:
+        min_interval: 距上次快照的最短间隔（秒）
+
+    Returns:
+        新快照ID，未到间隔或没有变化时返回 None
+    """
+    result = conn.execute(_SNAPSHOT, {'window': f'-{int(min_interval)} seconds'})
+    if result.rowcount != 1:
+        return None
+    snapshot_id = result.lastrowid
+    conn.execute(_SNAPSHOT_ITEMS, {'snapshot_id': snapshot_id})
+    return snapshot_id
+
+
+def ensure_ledger_triggers():
+    """创建缺失的触发器，首次创建时记录一次基准快照，台账从此刻开始完整"""
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'inventories'")
+            )
+        }
+        missing = [name for name in TRIGGERS if name not in existing]
+        if not missing:
+            return
+
+        for name in missing:
+            conn.execute(text(f'CREATE TRIGGER {name} {TRIGGERS[name]}'))
+        take_snapshot(conn)
+
+
+def quantities_as_of(before, plate_id=None):
+    """
+    查询某一时刻（不含）之前最后的各批次数量
+
+    Args:
+        before: 截止时间
+        plate_id: 只查询该铝板
+
+    Returns:
+        (快照, [(库存ID, 铝板ID, 数量), ...])，早于台账起始时间时返回 (None, [])
+    """
+    snapshot = StockSnapshot.query.filter(
+        StockSnapshot.taken_at < before
+    ).order_by(StockSnapshot.taken_at.desc()).first()
+    if snapshot is None:
+        return None, []
+
+    next_seq = db.session.query(StockSnapshot.ledger_seq).filter(
+        StockSnapshot.id > snapshot.id
+    ).order_by(StockSnapshot.id).limit(1).scalar()
+
+    base = select(
+        StockSnapshotItem.inventory_id,
+        StockSnapshotItem.plate_id,
+        StockSnapshotItem.quantity
+    ).where(StockSnapshotItem.snapshot_id == snapshot.id)
+
+    # 两次快照之间的台账，下一次快照之后的记录时间都不早于该快照
+    ledger = select(
+        StockLedgerEntry.inventory_id,
+        StockLedgerEntry.plate_id,
+        StockLedgerEntry.delta
+    ).where(
+        StockLedgerEntry.id > snapshot.ledger_seq,
+        StockLedgerEntry.occurred_at < before
+    )
+    if next_seq is not None:
+        ledger = ledger.where(StockLedgerEntry.id <= next_seq)
+
+    if plate_id:
+        base = base.where(StockSnapshotItem.plate_id == plate_id)
+        ledger = ledger.where(StockLedgerEntry.plate_id == plate_id)
+
+    combined = union_all(base, ledger).subquery('as_of')
+    total = func.sum(combined.c.quantity)
+    rows = db.session.execute(
+        select(combined.c.inventory_id, func.max(combined.c.plate_id), total)
+        .group_by(combined.c.inventory_id)
+        .having(total != 0)
+        .order_by(combined.c.inventory_id)
+    ).all()
+    return snapshot, [tuple(row) for row in rows]
+
+
+class LedgerSnapshotter:
+    """后台线程，定期记录库存快照，多进程同时运行时由插入条件去重"""
+
+    def __init__(self, engine, interval):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ledger-snapshotter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        with self.engine.begin() as conn:
+            return take_snapshot(conn, self.interval)
+
+    def _run(self):
+        # 进程重启不推迟快照：检查间隔不超过10分钟，是否到期由上次快照时间决定
+        check_interval = min(self.interval, 600)
+        while not self._stop.wait(check_interval):
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception('库存快照记录失败')
+
+
+def init_ledger(app):
+    """启动快照线程，STOCK_SNAPSHOT_INTERVAL 为 0 时不启动"""
+    interval = app.config.get('STOCK_SNAPSHOT_INTERVAL', 0)
+    if interval:
+        snapshotter = LedgerSnapshotter(db.engine, interval)
+        snapshotter.start()
+        app.extensions['ledger_snapshotter'] = snapshotter
@@ -0,0 +1,167 @@
+"""
+库位层级
+
+存放位置按 仓库/库区/货架/货位 四级建模，locations.path 为物化路径（如 WH1/Z1/R01/），
+某库位及其全部下级的 path 都落在 [path, path 去掉末尾 / 后接 '0') 区间内，
+任意层级的汇总都是 path 唯一索引上的一次范围查询，不需要解析位置文本。
+录入的位置文本（如 WH1-Z1-R01）按 -、/ 和空白拆分为各级编码。
+"""
+import re
+from sqlalchemy import and_, case, func, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import Inventory, Location
+
+SEPARATOR = '/'
+# 紧跟在分隔符之后的字符，作为 path 区间的上界
+_UPPER = chr(ord(SEPARATOR) + 1)
+_SPLIT = re.compile(r'[\s/\-]+')
+
+# 回填时每条 UPDATE 处理的位置文本数
+BACKFILL_CHUNK_SIZE = 500
+
+
+def parse_location(text):
+    """
+    拆分位置文本为各级编码，超过四级的部分并入货位
+
+    Returns:
+        编码列表，文本为空时返回空列表
+    """
+    codes = [code for code in _SPLIT.split((text or '').strip()) if code]
+    depth = len(Location.LEVELS)
+    if len(codes) > depth:
+        codes = codes[:depth - 1] + ['-'.join(codes[depth - 1:])]
+    return codes
+
+
+def location_path(text):
+    """位置文本对应的物化路径，文本为空时返回 None"""
+    codes = parse_location(text)
+    return SEPARATOR.join(codes) + SEPARATOR if codes else None
+
+
+def within(path_column, path):
+    """path_column 为 path 本身或其下级"""
+    return and_(path_column >= path, path_column < path[:-1] + _UPPER)
+
+
+def _within_expr(path_column, ancestor_path):
+    """同 within，上界由 SQL 表达式计算，用于与另一张库位表关联"""
+    upper = func.substr(ancestor_path, 1, func.length(ancestor_path) - 1).concat(_UPPER)
+    return and_(path_column >= ancestor_path, path_column < upper)
+
+
+def resolve_locations(texts):
+    """
+    将位置文本解析为库位ID，缺失的各级库位在当前事务中创建
+
+    Returns:
+        {位置文本: 库位ID}，无法解析的空文本不在结果中
+    """
+    leaf_paths = {}
+    needed = {}
+    for text in texts:
+        codes = parse_location(text)
+        if not codes:
+            continue
+        for depth in range(1, len(codes) + 1):
+            needed[SEPARATOR.join(codes[:depth]) + SEPARATOR] = codes[:depth]
+        leaf_paths[text] = SEPARATOR.join(codes) + SEPARATOR
+
+    if not needed:
+        return {}
+
+    ids = dict(
+        db.session.query(Location.path, Location.id).filter(Location.path.in_(needed))
+    )
+    # 上级先于下级创建
+    for path in sorted(needed.keys() - ids.keys(), key=lambda path: len(needed[path])):
+        codes = needed[path]
+        parent_path = SEPARATOR.join(codes[:-1]) + SEPARATOR if len(codes) > 1 else None
+        db.session.execute(
+            insert(Location).values(
+                parent_id=ids.get(parent_path),
+                code=codes[-1],
+                level=len(codes),
+                path=path
+            ).on_conflict_do_nothing(index_elements=['path'])
+        )
+        ids[path] = db.session.query(Location.id).filter(Location.path == path).scalar()
+
+    return {text: ids[path] for text, path in leaf_paths.items()}
+
+
+def backfill_locations():
+    """为只有位置文本、尚未关联库位的库存批次创建并关联库位"""
+    texts = [
+        text for (text,) in db.session.query(Inventory.location).filter(
+            Inventory.location_id.is_(None),
+            Inventory.location.isnot(None)
+        ).distinct()
+    ]
+    if not texts:
+        return
+
+    resolved = resolve_locations(texts)
+    items = list(resolved.items())
+    for start in range(0, len(items), BACKFILL_CHUNK_SIZE):
+        chunk = dict(items[start:start + BACKFILL_CHUNK_SIZE])
+        db.session.execute(
+            update(Inventory)
+            .where(Inventory.location_id.is_(None), Inventory.location.in_(chunk))
+            # 保留原更新时间，回填不算库存变化
+            .values(location_id=case(chunk, value=Inventory.location), last_updated=Inventory.last_updated)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def find_location(text):
+    """按位置文本查找库位，不存在时返回 None"""
+    path = location_path(text)
+    if path is None:
+        return None
+    return Location.query.filter(Location.path == path).first()
+
+
+def location_ids_within(path):
+    """某库位及其全部下级的ID查询，用于 Inventory.location_id.in_()"""
+    return db.session.query(Location.id).filter(within(Location.path, path))
+
+
+def location_totals(location):
+    """某库位及其全部下级的 (库存总量, 批次数)"""
+    return db.session.query(
+        func.coalesce(func.sum(Inventory.quantity), 0),
+        func.count(Inventory.id)
+    ).join(
+        Location, Inventory.location_id == Location.id
+    ).filter(within(Location.path, location.path)).one()
+
+
+def child_rollups(parent=None):
+    """
+    下一级各库位的库存汇总，parent 为空时为各仓库
+
+    Returns:
+        [(库位, 库存总量, 批次数), ...]
+    """
+    descendant = aliased(Location)
+    query = db.session.query(
+        Location,
+        func.coalesce(func.sum(Inventory.quantity), 0),
+        func.count(Inventory.id)
+    ).outerjoin(
+        descendant, _within_expr(descendant.path, Location.path)
+    ).outerjoin(
+        Inventory, Inventory.location_id == descendant.id
+    )
+
+    if parent is None:
+        query = query.filter(Location.parent_id.is_(None))
+    else:
+        query = query.filter(Location.parent_id == parent.id)
+
+    return query.group_by(Location.id).order_by(Location.path).all()
@@ -0,0 +1,110 @@
+"""
+低库存标记维护
+
+inventories.is_low 由 SQLite 触发器随数量、预警阈值的变化同步更新，
+预警列表、低库存筛选和计数只需读取 is_low 部分索引。
+状态发生翻转时触发器同时写入 stock_warning_events，供 SSE 接口推送。
+"""
+import json
+import time
+from sqlalchemy import text
+from app import db
+from app.models import StockWarningEvent
+
+_LOW = 'coalesce(new.quantity <= new.warning_threshold, 0)'
+
+_EVENT_INSERT = (
+    'INSERT INTO stock_warning_events '
+    '(inventory_id, plate_id, is_low, quantity, warning_threshold, occurred_at) '
+    f'VALUES (new.id, new.plate_id, {_LOW}, new.quantity, new.warning_threshold, new.last_updated)'
+)
+
+TRIGGERS = {
+    'inventories_is_low_ai': (
+        f'CREATE TRIGGER inventories_is_low_ai AFTER INSERT ON inventories '
+        f'WHEN {_LOW} != new.is_low BEGIN '
+        f'UPDATE inventories SET is_low = {_LOW} WHERE id = new.id; '
+        f'{_EVENT_INSERT}; END'
+    ),
+    'inventories_is_low_au': (
+        f'CREATE TRIGGER inventories_is_low_au AFTER UPDATE OF quantity, warning_threshold ON inventories '
+        f'WHEN {_LOW} != old.is_low BEGIN '
+        f'UPDATE inventories SET is_low = {_LOW} WHERE id = new.id; '
+        f'{_EVENT_INSERT}; END'
+    ),
+}
+
+# 每次轮询最多取出的事件数
+EVENT_BATCH_SIZE = 100
+
+
+def ensure_low_stock_triggers():
+    """创建缺失的触发器，首次创建时按当前数量重算全部 is_low"""
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'inventories'")
+            )
+        }
+        missing = [name for name in TRIGGERS if name not in existing]
+        if not missing:
+            return
+
+        conn.execute(text(
+            'UPDATE inventories SET is_low = coalesce(quantity <= warning_threshold, 0) '
+            'WHERE is_low != coalesce(quantity <= warning_threshold, 0)'
+        ))
+        for name in missing:
+            conn.execute(text(TRIGGERS[name]))
+
+
+def latest_event_id():
+    """当前最新的预警事件ID，没有事件时为0"""
+    return db.session.query(db.func.coalesce(db.func.max(StockWarningEvent.id), 0)).scalar()
+
+
+def fetch_events(after_id, limit=EVENT_BATCH_SIZE):
+    """按ID顺序取出 after_id 之后的预警事件"""
+    return StockWarningEvent.query.filter(
+        StockWarningEvent.id > after_id
+    ).order_by(StockWarningEvent.id).limit(limit).all()
+
+
+def iter_event_stream(after_id, poll_interval, timeout, heartbeat=15):
+    """
+    以 Server-Sent Events 格式产出预警事件
+
+    每隔 poll_interval 秒按主键查询一次新事件，查询后立即结束读事务，
+    不会长时间占用数据库连接；超过 timeout 秒后结束，由客户端携带 Last-Event-ID 重连。
+
+    Args:
+        after_id: 从该事件ID之后开始推送
+        poll_interval: 轮询间隔（秒）
+        timeout: 单个连接最长保持时间（秒），0 表示不限制
+        heartbeat: 无事件时发送注释行保活的间隔（秒）
+    """
+    started = last_sent = time.monotonic()
+    yield f'retry: {int(poll_interval * 1000)}\n\n'
+
+    while True:
+        events = fetch_events(after_id)
+        db.session.remove()
+
+        for event in events:
+            after_id = event.id
+            name = 'low_stock' if event.is_low else 'restocked'
+            payload = json.dumps(event.to_dict(), ensure_ascii=False)
+            yield f'id: {event.id}\nevent: {name}\ndata: {payload}\n\n'
+
+        now = time.monotonic()
+        if events:
+            last_sent = now
+        elif now - last_sent >= heartbeat:
+            yield ': keep-alive\n\n'
+            last_sent = now
+
+        if timeout and now - started >= timeout:
+            return
+
+        if len(events) < EVENT_BATCH_SIZE:
+            time.sleep(poll_interval)
@@ -0,0 +1,186 @@
+"""
+接口指标采集
+
+按蓝图端点统计请求延迟直方图、SQL条数与耗时、to_dict 序列化耗时和响应字节数，
+以 Prometheus 文本格式在 /api/metrics 输出。
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from app import db
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _EndpointStats:
+    __slots__ = ('bucket_counts', 'latency_sum', 'requests', 'statuses',
+                 'sql_count', 'sql_time', 'serialize_time', 'response_bytes')
+
+    def __init__(self, bucket_count):
+        self.bucket_counts = [0] * (bucket_count + 1)
+        self.latency_sum = 0.0
+        self.requests = 0
+        self.statuses = {}
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    """线程安全的端点指标汇总"""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, status, latency, sql_count, sql_time, serialize_time, response_bytes):
+        """记录一次请求"""
+        bucket = bisect_left(self.buckets, latency)
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = _EndpointStats(len(self.buckets))
+            stats.bucket_counts[bucket] += 1
+            stats.latency_sum += latency
+            stats.requests += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.sql_count += sql_count
+            stats.sql_time += sql_time
+            stats.serialize_time += serialize_time
+            stats.response_bytes += response_bytes
+
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        with self._lock:
+            snapshot = [
+                (endpoint, list(s.bucket_counts), s.latency_sum, s.requests, dict(s.statuses),
+                 s.sql_count, s.sql_time, s.serialize_time, s.response_bytes)
+                for endpoint, s in sorted(self._stats.items())
+            ]
+
+        histogram = [
+            '# HELP http_request_duration_seconds Request latency by endpoint.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        requests_total = [
+            '# HELP http_requests_total Requests by endpoint and status code.',
+            '# TYPE http_requests_total counter',
+        ]
+        sql_count = [
+            '# HELP db_statements_total SQL statements executed by endpoint.',
+            '# TYPE db_statements_total counter',
+        ]
+        sql_time = [
+            '# HELP db_statement_duration_seconds_total Time spent executing SQL by endpoint.',
+            '# TYPE db_statement_duration_seconds_total counter',
+        ]
+        serialize_time = [
+            '# HELP serialization_duration_seconds_total Time spent in model to_dict() by endpoint.',
+            '# TYPE serialization_duration_seconds_total counter',
+        ]
+        response_bytes = [
+            '# HELP http_response_bytes_total Response body bytes by endpoint.',
+            '# TYPE http_response_bytes_total counter',
+        ]
+
+        for (endpoint, bucket_counts, latency_sum, requests, statuses,
+             sql_total, sql_seconds, serialize_seconds, bytes_total) in snapshot:
+            label = f'endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, bucket_counts):
+                cumulative += count
+                histogram.append(f'http_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            histogram.append(f'http_request_duration_seconds_bucket{{{label},le="+Inf"}} {requests}')
+            histogram.append(f'http_request_duration_seconds_sum{{{label}}} {latency_sum:.6f}')
+            histogram.append(f'http_request_duration_seconds_count{{{label}}} {requests}')
+            for status, count in sorted(statuses.items()):
+                requests_total.append(f'http_requests_total{{{label},status="{status}"}} {count}')
+            sql_count.append(f'db_statements_total{{{label}}} {sql_total}')
+            sql_time.append(f'db_statement_duration_seconds_total{{{label}}} {sql_seconds:.6f}')
+            serialize_time.append(f'serialization_duration_seconds_total{{{label}}} {serialize_seconds:.6f}')
+            response_bytes.append(f'http_response_bytes_total{{{label}}} {bytes_total}')
+
+        lines = histogram + requests_total + sql_count + sql_time + serialize_time + response_bytes
+        return '\n'.join(lines) + '\n'
+
+
+def _instrument_to_dict(model):
+    """包装模型的 to_dict，只统计最外层调用的耗时（嵌套调用不重复计入）"""
+    original = model.__dict__.get('to_dict')
+    if original is None or getattr(original, '_metrics_wrapped', False):
+        return
+
+    @wraps(original)
+    def to_dict(self, *args, **kwargs):
+        if not has_request_context() or 'metrics_start' not in g:
+            return original(self, *args, **kwargs)
+        if g.serialize_depth:
+            return original(self, *args, **kwargs)
+        g.serialize_depth = 1
+        started = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            g.serialize_time += time.perf_counter() - started
+            g.serialize_depth = 0
+
+    to_dict._metrics_wrapped = True
+    model.to_dict = to_dict
+
+
+def init_metrics(app):
+    """注册请求钩子、SQL事件和 /api/metrics 接口，需在应用上下文中调用"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    registry = MetricsRegistry(app.config.get('METRICS_LATENCY_BUCKETS') or DEFAULT_LATENCY_BUCKETS)
+    app.extensions['metrics'] = registry
+
+    for mapper in db.Model.registry.mappers:
+        _instrument_to_dict(mapper.class_)
+
+    engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics_start' in g:
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_query_start')
+        if starts and has_request_context() and 'metrics_start' in g:
+            g.sql_time += time.perf_counter() - starts.pop()
+            g.sql_count += 1
+
+    @app.before_request
+    def start_metrics():
+        g.metrics_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+        g.serialize_time = 0.0
+        g.serialize_depth = 0
+
+    @app.after_request
+    def record_metrics(response):
+        if 'metrics_start' in g:
+            registry.observe(
+                request.endpoint or 'unmatched',
+                response.status_code,
+                time.perf_counter() - g.metrics_start,
+                g.sql_count,
+                g.sql_time,
+                g.serialize_time,
+                response.calculate_content_length() or 0
+            )
+        return response
+
+    @app.route('/api/metrics')
+    def metrics():
+        """Prometheus 指标"""
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,120 @@
+"""
+入库操作员解析
+
+入库登记按操作员名称（真实姓名或用户名）关联用户，名称 -> 用户ID 缓存在进程内
+（app.extensions['operator_cache']），未命中时通过 real_name/username 索引查询。
+不存在的操作员自动创建：初始密码的哈希在写事务之外计算，每次只计算一次，新用户用单独的短事务提交，
+入库事务本身不做任何哈希运算。
+"""
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User
+from app.utils.passwords import hash_password
+
+# 自动创建的操作员账号的初始密码
+DEFAULT_OPERATOR_PASSWORD = '123456'
+
+
+def _lookup(names):
+    """按真实姓名或用户名查找，同名时取ID最小的用户"""
+    found = {}
+    rows = db.session.query(User.id, User.real_name, User.username).filter(
+        or_(User.real_name.in_(names), User.username.in_(names))
+    ).order_by(User.id)
+    for user_id, real_name, username in rows:
+        for name in (real_name, username):
+            if name in names:
+                found.setdefault(name, user_id)
+    return found
+
+
+def _new_operator(name, password_hash):
+    return User(
+        username=name.lower().replace(' ', '_'),
+        real_name=name,
+        role='warehouse',
+        status='active',
+        password_hash=password_hash
+    )
+
+
+def _provision(names):
+    """
+    创建缺失的操作员，返回 {名称: 用户ID}
+
+    整批提交遇到唯一约束冲突时（并发请求已创建同名操作员，或用户名与已有用户冲突），
+    先查找已被创建的，剩余的逐个创建
+    """
+    password_hash = hash_password(DEFAULT_OPERATOR_PASSWORD)
+    users = {name: _new_operator(name, password_hash) for name in names}
+    db.session.add_all(users.values())
+    try:
+        db.session.flush()
+        created = {name: user.id for name, user in users.items()}
+        db.session.commit()
+        return created
+    except IntegrityError:
+        db.session.rollback()
+
+    found = _lookup(names)
+    conflicts = []
+    for name in sorted(names - found.keys()):
+        user = _new_operator(name, password_hash)
+        db.session.add(user)
+        try:
+            db.session.flush()
+            found[name] = user.id
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            found.update(_lookup({name}))
+            if name not in found:
+                conflicts.append(name)
+
+    if conflicts:
+        raise ValueError(f'操作员用户名与已有用户冲突: {", ".join(conflicts)}')
+    return found
+
+
+def resolve_operators(names):
+    """
+    将操作员名称解析为用户ID，不存在的自动创建
+
+    自动创建时会提交当前会话，须在调用方开始写入之前调用。
+
+    Args:
+        names: 操作员名称集合
+
+    Returns:
+        {名称: 用户ID}
+
+    Raises:
+        ValueError: 新操作员的用户名与已有用户冲突
+    """
+    cache = current_app.extensions['operator_cache']
+    resolved = {}
+    missing = set()
+    for name in names:
+        user_id = cache.get(name)
+        if user_id is None:
+            missing.add(name)
+        else:
+            resolved[name] = user_id
+
+    if missing:
+        found = _lookup(missing)
+        new_names = missing - found.keys()
+        if new_names:
+            found.update(_provision(new_names))
+        for name, user_id in found.items():
+            cache.set(name, user_id)
+        resolved.update(found)
+
+    return resolved
+
+
+def invalidate_operators():
+    """清空操作员缓存，在修改或删除用户后调用"""
+    current_app.extensions['operator_cache'].clear()
@@ -0,0 +1,104 @@
+"""
+统计概览计数器
+
+计数结果连同计算时的表版本号缓存在进程内（app.extensions['overview_cache']），
+条目有效期内直接返回，不访问数据库。本进程的写操作提交后调用 invalidate_overview() 立即失效，
+其他进程的写入最多滞后 OVERVIEW_CACHE_MAX_AGE 秒可见。
+"""
+from flask import current_app, g
+from sqlalchemy import func, and_
+from app import db
+from app.models import Inventory, InboundRecord, OutboundRecord, DispatchTask
+from app.utils.time_utils import get_beijing_time
+from app.utils.versions import get_versions
+
+# 概览计数依赖的表
+OVERVIEW_TABLES = ('inventories', 'inbound_records', 'outbound_records', 'dispatch_tasks')
+
+
+def _compute_overview(today_start):
+    """查询数据库计算概览计数"""
+    total_inventory = db.session.query(
+        func.sum(Inventory.quantity)
+    ).scalar() or 0
+    
+    today_inbound = db.session.query(
+        func.sum(InboundRecord.quantity)
+    ).filter(
+        InboundRecord.inbound_time >= today_start
+    ).scalar() or 0
+    
+    today_outbound = db.session.query(
+        func.sum(OutboundRecord.quantity)
+    ).filter(
+        and_(
+            OutboundRecord.outbound_time >= today_start,
+            OutboundRecord.status == 'approved'
+        )
+    ).scalar() or 0
+    
+    pending_outbound = OutboundRecord.query.filter_by(
+        status='pending'
+    ).count()
+    
+    low_stock_warning = db.session.query(Inventory).filter(
+        Inventory.is_low == db.true()
+    ).count()
+    
+    pending_tasks = DispatchTask.query.filter(
+        DispatchTask.status.in_(['pending', 'in_progress'])
+    ).count()
+    
+    return {
+        'total_inventory': total_inventory,
+        'today_inbound': today_inbound,
+        'today_outbound': today_outbound,
+        'pending_outbound': pending_outbound,
+        'low_stock_warning': low_stock_warning,
+        'pending_tasks': pending_tasks
+    }
+
+
+def _cached_entry():
+    """当天有效的缓存条目，不存在时返回 None"""
+    return current_app.extensions['overview_cache'].get(get_beijing_time().date())
+
+
+def get_overview_versions():
+    """
+    概览 ETag 使用的表版本
+
+    缓存条目有效时复用条目记录的版本，不读取 table_versions
+    """
+    entry = _cached_entry()
+    if entry is not None:
+        return entry['versions'], entry['last_modified']
+    return get_versions(OVERVIEW_TABLES)
+
+
+def get_overview_counters():
+    """
+    获取概览计数，优先读取缓存
+
+    缓存按自然日区分条目；重新计算前先确定版本号（优先复用 conditional_get 已读取的 g.table_versions），
+    版本号不会新于计数结果，不会产生错误的 304
+    """
+    cache = current_app.extensions['overview_cache']
+    now = get_beijing_time()
+    
+    entry = cache.get(now.date())
+    if entry is None:
+        versions, last_modified = g.get('table_versions') or get_versions(OVERVIEW_TABLES)
+        entry = {
+            'versions': versions,
+            'last_modified': last_modified,
+            'overview': _compute_overview(now.replace(hour=0, minute=0, second=0, microsecond=0)),
+        }
+        cache.set(now.date(), entry)
+    
+    return dict(entry['overview'])
+
+
+def invalidate_overview():
+    """使概览计数缓存失效，在相关写操作提交后调用"""
+    current_app.extensions['overview_cache'].clear()
@@ -0,0 +1,83 @@
+"""
+游标（Keyset）分页工具
+
+按排序键 + id 定位下一页的起点，避免 paginate() 的 COUNT(*) 和 OFFSET 扫描，
+翻页深度不影响单页耗时。
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort_value, item_id):
+    """将排序键和id编码为游标字符串"""
+    if isinstance(sort_value, datetime):
+        sort_value = {'dt': sort_value.isoformat()}
+    raw = json.dumps([sort_value, item_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解析游标字符串
+
+    Returns:
+        (sort_value, item_id)
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, item_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value['dt'])
+        return sort_value, int(item_id)
+    except (TypeError, KeyError, json.JSONDecodeError, UnicodeError, ValueError) as e:
+        raise ValueError('游标格式错误') from e
+
+
+def keyset_paginate(query, sort_column, id_column, cursor, per_page):
+    """
+    按 (sort_column DESC, id DESC) 进行游标分页
+
+    Args:
+        query: 已应用筛选条件的查询
+        sort_column: 排序列，与 id_column 相同时仅按id排序
+        id_column: 主键列，作为排序键相同时的决胜键
+        cursor: 上一页返回的 next_cursor，为空表示第一页
+        per_page: 每页条数
+
+    Returns:
+        (items, next_cursor)，没有更多数据时 next_cursor 为 None
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    single_key = sort_column is id_column
+
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        if single_key:
+            query = query.filter(id_column < last_id)
+        else:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < last_id)
+            ))
+
+    if single_key:
+        query = query.order_by(id_column.desc())
+    else:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+
+    items = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    return items, next_cursor
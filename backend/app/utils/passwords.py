@@ -0,0 +1,117 @@
+"""
+密码哈希
+
+密码哈希和校验是CPU密集的KDF运算，放到有界进程池中执行，不占用请求线程的GIL，
+也不会在持有数据库写锁时运行。哈希算法和成本由 PASSWORD_HASH_METHOD 配置，
+登录时发现旧哈希的参数与配置不一致会自动重新哈希。
+
+进程池在后台线程启动后才创建，fork 会把其他线程持有的锁复制进子进程，因此从 forkserver 启动工作进程；
+forkserver 只预加载 werkzeug.security，工作进程启动时也不重新执行入口脚本（run.py）。
+"""
+import multiprocessing
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusyError(RuntimeError):
+    """等待中的哈希任务已达上限"""
+
+
+@contextmanager
+def _without_main_module():
+    """
+    临时隐藏 __main__
+
+    multiprocessing 会在新进程中以 __mp_main__ 重新执行父进程的入口脚本，
+    入口脚本在模块级创建应用，工作进程中不应再次执行
+    """
+    main_module = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main_module
+
+
+class PasswordHasher:
+    """进程池哈希执行器，workers 为 0 时在当前线程执行"""
+
+    def __init__(self, method, workers, max_pending, timeout):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['werkzeug.security'])
+                pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                # 没有空闲进程时 submit 会同步启动新进程，一次性启动全部工作进程，之后不再创建
+                with _without_main_module():
+                    warmup = [pool.submit(int) for _ in range(self.workers)]
+                for future in warmup:
+                    future.result(timeout=self.timeout)
+                self._pool = pool
+            return self._pool
+
+    def _call(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusyError('密码校验繁忙，请稍后重试')
+        try:
+            return self._executor().submit(func, *args).result(timeout=self.timeout)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._call(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._call(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """哈希使用的算法或成本参数与当前配置不一致"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+
+def init_password_hasher(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT']
+    )
+
+
+def _hasher():
+    return current_app.extensions['password_hasher']
+
+
+def hash_password(password):
+    """生成密码哈希"""
+    return _hasher().hash(password)
+
+
+def verify_password(password_hash, password):
+    """校验密码"""
+    return _hasher().verify(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return _hasher().needs_rehash(password_hash)
@@ -0,0 +1,47 @@
+"""
+SQL查询计数工具
+
+用于约束接口的SQL语句数量（见 check_query_plans.py），防止列表接口在序列化时出现N+1查询。
+"""
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import db
+
+
+class QueryCounter:
+    """记录执行过的SQL语句"""
+
+    def __init__(self):
+        self.executions = []
+
+    @property
+    def statements(self):
+        return [statement for statement, _ in self.executions]
+
+    @property
+    def count(self):
+        return len(self.executions)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.executions.append((statement, parameters))
+
+
+@contextmanager
+def count_queries(engine=None):
+    """
+    统计上下文内执行的SQL语句
+
+    Args:
+        engine: SQLAlchemy引擎，默认为当前应用的 db.engine
+
+    Yields:
+        QueryCounter实例
+    """
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
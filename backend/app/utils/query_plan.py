@@ -0,0 +1,34 @@
+"""
+SQLite 查询计划检查工具
+"""
+import re
+
+# 只匹配未使用任何索引的全表扫描，例如 "SCAN inventories" 或 "SCAN inventories AS i"
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def explain(conn, statement, parameters=()):
+    """
+    对一条SQL执行 EXPLAIN QUERY PLAN，executemany 的参数列表只取第一组
+
+    Returns:
+        查询计划中每一步的描述列表
+    """
+    if isinstance(parameters, list):
+        parameters = parameters[0] if parameters else ()
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters or ())
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def find_full_scans(plan):
+    """从查询计划描述中找出被全表扫描的表名"""
+    tables = []
+    for detail in plan:
+        match = FULL_SCAN_PATTERN.match(detail)
+        if match:
+            tables.append(match.group(1))
+    return tables
@@ -0,0 +1,76 @@
+"""
+每日出入库汇总维护工具
+"""
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from app import db
+from app.models import DailyMovement, InboundRecord, OutboundRecord
+
+
+def record_movement(plate_id, moved_at, inbound_quantity=0, outbound_quantity=0):
+    """
+    在当前事务中累加某铝板当天的出入库数量
+
+    Args:
+        plate_id: 铝板ID
+        moved_at: 入库/出库时间
+        inbound_quantity: 入库数量增量
+        outbound_quantity: 出库数量增量
+    """
+    stmt = insert(DailyMovement).values(
+        day=moved_at.date(),
+        plate_id=plate_id,
+        inbound_quantity=inbound_quantity,
+        outbound_quantity=outbound_quantity
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['day', 'plate_id'],
+        set_={
+            'inbound_quantity': DailyMovement.inbound_quantity + stmt.excluded.inbound_quantity,
+            'outbound_quantity': DailyMovement.outbound_quantity + stmt.excluded.outbound_quantity
+        }
+    )
+    db.session.execute(stmt)
+
+
+def backfill_daily_movements():
+    """
+    根据入库、出库记录全量重建每日汇总表
+
+    Returns:
+        重建后的汇总行数
+    """
+    inbound_day = func.date(InboundRecord.inbound_time)
+    outbound_day = func.date(OutboundRecord.outbound_time)
+
+    totals = {}
+    inbound_rows = db.session.query(
+        inbound_day, InboundRecord.plate_id, func.sum(InboundRecord.quantity)
+    ).group_by(inbound_day, InboundRecord.plate_id)
+    for day, plate_id, quantity in inbound_rows:
+        totals.setdefault((day, plate_id), [0, 0])[0] = quantity or 0
+
+    outbound_rows = db.session.query(
+        outbound_day, OutboundRecord.plate_id, func.sum(OutboundRecord.quantity)
+    ).filter(
+        OutboundRecord.status == 'approved',
+        OutboundRecord.outbound_time.isnot(None)
+    ).group_by(outbound_day, OutboundRecord.plate_id)
+    for day, plate_id, quantity in outbound_rows:
+        totals.setdefault((day, plate_id), [0, 0])[1] = quantity or 0
+
+    DailyMovement.query.delete()
+    if totals:
+        db.session.execute(insert(DailyMovement), [
+            {
+                'day': datetime.strptime(day, '%Y-%m-%d').date(),
+                'plate_id': plate_id,
+                'inbound_quantity': inbound_quantity,
+                'outbound_quantity': outbound_quantity
+            }
+            for (day, plate_id), (inbound_quantity, outbound_quantity) in totals.items()
+        ])
+    db.session.commit()
+
+    return len(totals)
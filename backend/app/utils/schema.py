@@ -0,0 +1,42 @@
+"""
+数据库结构升级工具
+
+db.create_all() 只会创建缺失的表，已有数据库中新增的列和索引需要在这里补齐。
+"""
+from sqlalchemy import inspect, text
+from app import db
+
+
+def _add_missing_columns(conn, table):
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}'
+        if column.server_default is not None:
+            ddl += f' DEFAULT {column.server_default.arg}'
+        if not column.nullable:
+            ddl += ' NOT NULL'
+        if column.foreign_keys:
+            fk = next(iter(column.foreign_keys))
+            ddl += f' REFERENCES {fk.column.table.name} ({fk.column.name})'
+        conn.execute(text(ddl))
+
+
+def upgrade_schema():
+    """为已存在的表补建模型中新增的列（需可为空或带 server_default）和索引"""
+    with db.engine.begin() as conn:
+        existing_tables = set(inspect(conn).get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name in existing_tables:
+                _add_missing_columns(conn, table)
+
+    # 按名称判断索引是否存在：反射会跳过表达式索引，checkfirst 无法识别
+    with db.engine.connect() as conn:
+        existing_indexes = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))
+        }
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(db.engine)
@@ -0,0 +1,104 @@
+"""
+全文检索工具
+
+为铝板型号/规格/供应商、库存批次号、入库记录批次号/供应商建立 SQLite FTS5 trigram 索引
+（外部内容表，由触发器随基础表同步），替代无法使用B树索引的 LIKE '%x%' 扫描。
+"""
+from flask import current_app
+from sqlalchemy import or_, select, table, literal_column, text
+from app import db
+
+# 基础表 -> 建立索引的列
+SEARCH_INDEXES = {
+    'aluminum_plates': ['model', 'specification', 'supplier'],
+    'inventories': ['batch_number'],
+    'inbound_records': ['batch_number', 'supplier'],
+}
+
+# trigram 分词至少需要3个字符才能命中索引
+MIN_TERM_LENGTH = 3
+
+
+def _fts_name(table_name):
+    return f'{table_name}_fts'
+
+
+def _fts5_available(conn):
+    if conn.dialect.name != 'sqlite':
+        return False
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x, tokenize='trigram')"))
+        conn.execute(text('DROP TABLE temp._fts5_probe'))
+        return True
+    except Exception:
+        return False
+
+
+def ensure_search_indexes():
+    """
+    创建缺失的FTS5索引表和同步触发器，新建的索引会从基础表重建一次
+
+    Returns:
+        当前数据库是否支持FTS5 trigram索引
+    """
+    with db.engine.begin() as conn:
+        if not _fts5_available(conn):
+            return False
+
+        for table_name, columns in SEARCH_INDEXES.items():
+            fts = _fts_name(table_name)
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': fts}
+            ).first()
+            if exists:
+                continue
+
+            column_list = ', '.join(columns)
+            new_values = ', '.join(f'new.{c}' for c in columns)
+            old_values = ', '.join(f'old.{c}' for c in columns)
+
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, "
+                f"content='{table_name}', content_rowid='id', tokenize='trigram')"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+                f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column_list} ON {table_name} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+            ))
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+    return True
+
+
+def search_condition(columns, term):
+    """
+    生成“任一列包含 term”的筛选条件
+
+    term 不少于3个字符且索引可用时，通过FTS5索引查出匹配的主键；否则退回 LIKE 匹配。
+
+    Args:
+        columns: 同一张表上建立了索引的列，如 [AluminumPlate.model, AluminumPlate.supplier]
+        term: 搜索关键字
+    """
+    if not current_app.extensions.get('fts_search') or len(term) < MIN_TERM_LENGTH:
+        return or_(*[column.contains(term) for column in columns])
+
+    base = columns[0].class_.__table__
+    fts = _fts_name(base.name)
+    column_filter = ' '.join(column.key for column in columns)
+    phrase = '"' + term.replace('"', '""') + '"'
+
+    matched_ids = select(literal_column('rowid')).select_from(table(fts)).where(
+        literal_column(fts).op('MATCH')(f'{{{column_filter}}} : {phrase}')
+    )
+    return base.c.id.in_(matched_ids)
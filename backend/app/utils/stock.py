@@ -0,0 +1,347 @@
+"""
+库存预留与扣减
+
+出库数量按批次入库时间先进先出拆分到多个批次：沿 ix_inventories_fifo 部分索引
+顺序读取有可用数量的批次，凑够数量即停止读取，铝板批次再多也只读需要的几行。
+拆分结果记录在 outbound_allocations，并用一条带条件的 UPDATE 同时作用到全部批次，
+由数据库保证不会超扣，多个进程并发申请、审批时无需应用层加锁。
+"""
+from sqlalchemy import case, insert, select, text, update
+from app import db
+from app.models import Inventory, OutboundAllocation
+from app.utils.time_utils import get_beijing_time
+
+# 先进先出读取批次时每次从游标取出的行数
+FIFO_FETCH_SIZE = 32
+
+# 并发修改导致部分批次未能扣减时，重新分配剩余数量的次数
+ALLOCATION_ATTEMPTS = 3
+
+
+def _available():
+    return Inventory.quantity - Inventory.reserved_quantity
+
+
+def _conditional_update(inventory_id, condition, **values):
+    result = db.session.execute(
+        update(Inventory)
+        .where(Inventory.id == inventory_id, condition)
+        .values(last_updated=get_beijing_time(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _plan_fifo(plate_id, quantity):
+    """
+    按入库时间顺序从有可用数量的批次中凑够 quantity
+
+    Returns:
+        ([(库存ID, 数量), ...], 仍未凑够的数量)
+    """
+    result = db.session.execute(
+        select(Inventory.id, _available())
+        .where(Inventory.plate_id == plate_id, Inventory.quantity > Inventory.reserved_quantity)
+        .order_by(Inventory.received_at, Inventory.id)
+        .execution_options(yield_per=FIFO_FETCH_SIZE)
+    )
+    lines = []
+    remaining = quantity
+    for inventory_id, available in result:
+        take = min(available, remaining)
+        lines.append((inventory_id, take))
+        remaining -= take
+        if remaining == 0:
+            break
+    result.close()
+    return lines, remaining
+
+
+def _apply_lines(lines, condition, **values):
+    """
+    用一条 UPDATE 把各批次的数量作用到库存上
+
+    Args:
+        lines: [(库存ID, 数量), ...]
+        condition: 以本批次数量表达式为参数、返回行条件的函数
+        values: 列名 -> 以本批次数量表达式为参数、返回新值的函数
+
+    Returns:
+        满足条件并已更新的库存ID集合
+    """
+    take = case(dict(lines), value=Inventory.id)
+    result = db.session.execute(
+        update(Inventory)
+        .where(Inventory.id.in_([inventory_id for inventory_id, _ in lines]), condition(take))
+        .values(last_updated=get_beijing_time(), **{name: value(take) for name, value in values.items()})
+        .returning(Inventory.id)
+        .execution_options(synchronize_session=False)
+    )
+    return {inventory_id for (inventory_id,) in result}
+
+
+def _allocate_fifo(plate_id, total, **values):
+    """
+    先进先出分配 total 并作用到库存，被并发修改的批次重新分配
+
+    Returns:
+        [(库存ID, 数量), ...]，可用数量不足时返回 None（已作用的部分由调用方回滚）
+    """
+    allocated = {}
+    remaining = total
+    for _ in range(ALLOCATION_ATTEMPTS):
+        lines, shortfall = _plan_fifo(plate_id, remaining)
+        if shortfall:
+            return None
+        applied = _apply_lines(lines, lambda take: _available() >= take, **values)
+        for inventory_id, take in lines:
+            if inventory_id in applied:
+                allocated[inventory_id] = allocated.get(inventory_id, 0) + take
+                remaining -= take
+        if remaining == 0:
+            return list(allocated.items())
+    return None
+
+
+def _record_allocations(allocations):
+    """记录分配明细，allocations 为 [(出库申请, [(库存ID, 数量), ...]), ...]"""
+    db.session.execute(insert(OutboundAllocation), [
+        {'outbound_id': outbound.id, 'inventory_id': inventory_id, 'quantity': quantity}
+        for outbound, lines in allocations
+        for inventory_id, quantity in lines
+    ])
+    for outbound, lines in allocations:
+        outbound.inventory_id = lines[0][0]
+
+
+def _split_lines(lines, quantities):
+    """把先进先出分配到的批次数量按顺序拆给各申请，返回与 quantities 对应的明细列表"""
+    pool = list(lines)
+    result = []
+    for quantity in quantities:
+        own = []
+        while quantity:
+            inventory_id, available = pool[0]
+            take = min(available, quantity)
+            own.append((inventory_id, take))
+            quantity -= take
+            if take == available:
+                pool.pop(0)
+            else:
+                pool[0] = (inventory_id, available - take)
+        result.append(own)
+    return result
+
+
+def allocation_lines(outbound_id):
+    """出库申请的分配明细 [(库存ID, 数量), ...]"""
+    return db.session.query(
+        OutboundAllocation.inventory_id, OutboundAllocation.quantity
+    ).filter(
+        OutboundAllocation.outbound_id == outbound_id
+    ).order_by(OutboundAllocation.id).all()
+
+
+def _reserved_lines(outbounds):
+    """
+    各申请已预留的批次明细，分批预留上线前的申请视为在 inventory_id 上预留了全部数量
+
+    Returns:
+        {申请ID: [(库存ID, 数量), ...]}，没有预留的申请不在结果中
+    """
+    reserved = {}
+    rows = db.session.query(
+        OutboundAllocation.outbound_id, OutboundAllocation.inventory_id, OutboundAllocation.quantity
+    ).filter(
+        OutboundAllocation.outbound_id.in_([outbound.id for outbound in outbounds])
+    ).order_by(OutboundAllocation.id)
+    for outbound_id, inventory_id, quantity in rows:
+        reserved.setdefault(outbound_id, []).append((inventory_id, quantity))
+
+    for outbound in outbounds:
+        if outbound.id not in reserved and outbound.inventory_id:
+            reserved[outbound.id] = [(outbound.inventory_id, outbound.quantity)]
+    return reserved
+
+
+def _sum_lines(line_lists):
+    totals = {}
+    for lines in line_lists:
+        for inventory_id, quantity in lines:
+            totals[inventory_id] = totals.get(inventory_id, 0) + quantity
+    return list(totals.items())
+
+
+def available_quantity(plate_id):
+    """铝板所有批次的可用数量（总数减去已预留）"""
+    return db.session.query(
+        db.func.coalesce(db.func.sum(_available()), 0)
+    ).filter(Inventory.plate_id == plate_id).scalar()
+
+
+def reserve_stock(outbound):
+    """
+    为出库申请按先进先出预留库存并记录分配明细（申请记录需已 flush）
+
+    Returns:
+        [(库存ID, 数量), ...]，可用数量不足时返回 None
+    """
+    lines = _allocate_fifo(
+        outbound.plate_id, outbound.quantity,
+        reserved_quantity=lambda take: Inventory.reserved_quantity + take
+    )
+    if lines:
+        _record_allocations([(outbound, lines)])
+    return lines
+
+
+def release_reservation(outbound):
+    """释放出库申请占用的预留数量"""
+    release_reservations([outbound])
+
+
+def release_reservations(outbounds):
+    """释放多个出库申请占用的预留数量，按批次汇总后一条 UPDATE 完成"""
+    totals = _sum_lines(_reserved_lines(outbounds).values())
+    if totals:
+        _apply_lines(
+            totals,
+            lambda take: Inventory.reserved_quantity >= take,
+            reserved_quantity=lambda take: Inventory.reserved_quantity - take
+        )
+
+
+def consume_stock(outbound):
+    """
+    审批通过时扣减库存
+
+    已预留的申请按分配明细同时扣减数量和预留；分批预留上线前的申请只预留了
+    inventory_id 一个批次；预留功能上线前的申请没有预留，按先进先出分配扣减。
+
+    Returns:
+        [(库存ID, 数量), ...]，库存不足时返回 None
+    """
+    lines = allocation_lines(outbound.id)
+    if lines:
+        applied = _apply_lines(
+            lines,
+            lambda take: (Inventory.quantity >= take) & (Inventory.reserved_quantity >= take),
+            quantity=lambda take: Inventory.quantity - take,
+            reserved_quantity=lambda take: Inventory.reserved_quantity - take
+        )
+        return lines if len(applied) == len(lines) else None
+
+    if outbound.inventory_id:
+        if _conditional_update(
+            outbound.inventory_id,
+            (Inventory.quantity >= outbound.quantity) & (Inventory.reserved_quantity >= outbound.quantity),
+            quantity=Inventory.quantity - outbound.quantity,
+            reserved_quantity=Inventory.reserved_quantity - outbound.quantity
+        ):
+            return [(outbound.inventory_id, outbound.quantity)]
+        return None
+
+    lines = _allocate_fifo(
+        outbound.plate_id, outbound.quantity,
+        quantity=lambda take: Inventory.quantity - take
+    )
+    if lines:
+        _record_allocations([(outbound, lines)])
+    return lines
+
+
+def consume_stock_batch(outbounds):
+    """
+    批量审批时扣减库存，调用方需已在当前事务中领取这些申请（持有写锁，读到的库存不会再变）
+
+    已预留的申请按分配明细汇总到批次，与批次当前数量、预留数一次比较后用一条 UPDATE 扣减；
+    没有预留的申请按铝板汇总，与铝板可用数量比较后每个铝板先进先出分配一次，再拆给各申请。
+    按传入顺序满足，库存不足的申请不扣减。
+
+    Returns:
+        {申请ID: [(库存ID, 数量), ...]，库存不足时为 None}
+    """
+    results = {}
+    reserved = _reserved_lines(outbounds)
+
+    inventory_ids = {inventory_id for lines in reserved.values() for inventory_id, _ in lines}
+    remaining = {
+        inventory_id: [quantity, reserved_quantity]
+        for inventory_id, quantity, reserved_quantity in db.session.query(
+            Inventory.id, Inventory.quantity, Inventory.reserved_quantity
+        ).filter(Inventory.id.in_(inventory_ids))
+    }
+    for outbound in outbounds:
+        lines = reserved.get(outbound.id)
+        if lines is None:
+            continue
+        if all(
+            inventory_id in remaining and min(remaining[inventory_id]) >= quantity
+            for inventory_id, quantity in lines
+        ):
+            for inventory_id, quantity in lines:
+                remaining[inventory_id][0] -= quantity
+                remaining[inventory_id][1] -= quantity
+            results[outbound.id] = lines
+        else:
+            results[outbound.id] = None
+
+    totals = _sum_lines(lines for lines in results.values() if lines)
+    if totals:
+        _apply_lines(
+            totals,
+            lambda take: (Inventory.quantity >= take) & (Inventory.reserved_quantity >= take),
+            quantity=lambda take: Inventory.quantity - take,
+            reserved_quantity=lambda take: Inventory.reserved_quantity - take
+        )
+
+    by_plate = {}
+    for outbound in outbounds:
+        if outbound.id not in reserved:
+            by_plate.setdefault(outbound.plate_id, []).append(outbound)
+    available = dict(
+        db.session.query(Inventory.plate_id, db.func.sum(_available())).filter(
+            Inventory.plate_id.in_(by_plate)
+        ).group_by(Inventory.plate_id)
+    ) if by_plate else {}
+
+    new_allocations = []
+    for plate_id, plate_outbounds in by_plate.items():
+        left = available.get(plate_id) or 0
+        accepted = []
+        for outbound in plate_outbounds:
+            if outbound.quantity <= left:
+                accepted.append(outbound)
+                left -= outbound.quantity
+            else:
+                results[outbound.id] = None
+        if not accepted:
+            continue
+
+        lines = _allocate_fifo(
+            plate_id, sum(outbound.quantity for outbound in accepted),
+            quantity=lambda take: Inventory.quantity - take
+        )
+        if lines is None:
+            for outbound in accepted:
+                results[outbound.id] = None
+            continue
+        for outbound, own in zip(accepted, _split_lines(lines, [o.quantity for o in accepted])):
+            results[outbound.id] = own
+            new_allocations.append((outbound, own))
+
+    if new_allocations:
+        _record_allocations(new_allocations)
+    return results
+
+
+def backfill_received_at():
+    """补齐升级前批次的入库时间：取该批次最早的入库记录时间，没有入库记录时取最后更新时间"""
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'UPDATE inventories SET received_at = coalesce(('
+            'SELECT min(inbound_time) FROM inbound_records '
+            'WHERE inbound_records.plate_id = inventories.plate_id '
+            'AND inbound_records.batch_number = inventories.batch_number'
+            '), last_updated) WHERE received_at IS NULL'
+        ))
@@ -0,0 +1,215 @@
+"""
+盘点批次
+
+开启盘点时用一条 INSERT ... SELECT 快照范围内各库存批次的账面数量；
+实盘数按批提交，每批一条 executemany UPDATE；
+关闭时在同一事务中批量生成盘点记录并按差异调整库存。
+调整量为 实盘数 - 快照数，叠加到当前数量上，盘点期间发生的出入库不会被覆盖。
+调整后低于待审批出库占用数量（reserved_quantity）的批次视为冲突，整个盘点不关闭，
+需先审批或驳回相关出库申请后再关闭。
+"""
+from sqlalchemy import bindparam, exists, func, insert, literal, select, update
+from app import db
+from app.models import Inventory, InventoryCheck, StocktakeLine, StocktakeSession
+from app.utils.locations import location_ids_within, location_path
+from app.utils.time_utils import get_beijing_time
+
+
+def open_session(user_id, plate_id=None, location=None, remark=None):
+    """
+    开启盘点并快照账面数量
+
+    Returns:
+        新建的盘点批次
+    """
+    session = StocktakeSession(
+        status='open',
+        plate_id=plate_id,
+        location=location,
+        created_by=user_id,
+        remark=remark
+    )
+    db.session.add(session)
+    db.session.flush()
+
+    snapshot = select(literal(session.id), Inventory.id, Inventory.quantity)
+    if plate_id:
+        snapshot = snapshot.where(Inventory.plate_id == plate_id)
+    if location:
+        path = location_path(location)
+        snapshot = snapshot.where(Inventory.location_id.in_(location_ids_within(path)))
+
+    result = db.session.execute(
+        insert(StocktakeLine).from_select(
+            ['session_id', 'inventory_id', 'expected_quantity'], snapshot
+        )
+    )
+    session.line_count = result.rowcount
+    db.session.commit()
+    return session
+
+
+def parse_counts(items):
+    """
+    校验实盘数列表，同一批次出现多次时以最后一次为准
+
+    Returns:
+        {库存ID: 实盘数}
+
+    Raises:
+        ValueError: 格式错误
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('counts 必须是非空数组')
+
+    counts = {}
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f'第{index}行格式错误')
+        try:
+            inventory_id = int(item['inventory_id'])
+            actual_quantity = int(item['actual_quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'第{index}行库存ID和实际数量必须是整数')
+        if actual_quantity < 0:
+            raise ValueError(f'第{index}行实际数量不能为负数')
+        counts[inventory_id] = actual_quantity
+    return counts
+
+
+def submit_counts(session_id, counts, user_id):
+    """
+    写入一批实盘数
+
+    Args:
+        counts: {库存ID: 实盘数}
+
+    Returns:
+        (是否写入, 不在盘点范围内的库存ID列表)，盘点已关闭时返回 (False, [])
+    """
+    known = {
+        inventory_id for (inventory_id,) in db.session.query(StocktakeLine.inventory_id).filter(
+            StocktakeLine.session_id == session_id,
+            StocktakeLine.inventory_id.in_(counts)
+        )
+    }
+    unknown = sorted(set(counts) - known)
+    if unknown:
+        return False, unknown
+
+    lines = StocktakeLine.__table__
+    still_open = exists().where(
+        StocktakeSession.id == session_id,
+        StocktakeSession.status == 'open'
+    )
+    result = db.session.execute(
+        update(lines)
+        .where(
+            lines.c.session_id == session_id,
+            lines.c.inventory_id == bindparam('b_inventory_id'),
+            still_open
+        )
+        .values(
+            counted_quantity=bindparam('b_counted_quantity'),
+            counted_by=user_id,
+            counted_at=get_beijing_time()
+        ),
+        [
+            {'b_inventory_id': inventory_id, 'b_counted_quantity': quantity}
+            for inventory_id, quantity in counts.items()
+        ]
+    )
+    # 关闭与提交并发时，整批要么全部在关闭前写入，要么全部不写
+    if result.rowcount != len(counts):
+        db.session.rollback()
+        return False, []
+
+    db.session.commit()
+    return True, []
+
+
+def close_session(session_id, user_id):
+    """
+    关闭盘点：生成盘点记录并调整有差异的库存，全部在一个事务中完成
+
+    未提交实盘数的批次不生成记录，也不调整数量。
+
+    Returns:
+        (关闭后的盘点批次, 冲突批次列表)；盘点不存在或已关闭时返回 (None, [])，
+        有批次调整后低于占用数量时不做任何修改，返回 (None, 冲突批次列表)
+    """
+    now = get_beijing_time()
+    counted = (StocktakeLine.session_id == session_id) & StocktakeLine.counted_quantity.isnot(None)
+    difference = StocktakeLine.counted_quantity - StocktakeLine.expected_quantity
+
+    result = db.session.execute(
+        update(StocktakeSession)
+        .where(StocktakeSession.id == session_id, StocktakeSession.status == 'open')
+        .values(
+            status='closed',
+            closed_by=user_id,
+            closed_at=now,
+            counted_count=select(func.count(StocktakeLine.id)).where(counted).scalar_subquery(),
+            discrepancy_count=select(func.count(StocktakeLine.id)).where(
+                counted, difference != 0
+            ).scalar_subquery()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return None, []
+
+    # 上面的 UPDATE 已取得写锁，此时读到的占用数量在提交前不会变化
+    adjusted = Inventory.quantity + difference
+    conflicts = [
+        {
+            'inventory_id': inventory_id,
+            'counted_quantity': counted_quantity,
+            'adjusted_quantity': max(adjusted_quantity, 0),
+            'reserved_quantity': reserved_quantity
+        }
+        for inventory_id, counted_quantity, adjusted_quantity, reserved_quantity in db.session.query(
+            Inventory.id, StocktakeLine.counted_quantity, adjusted, Inventory.reserved_quantity
+        ).join(
+            StocktakeLine, StocktakeLine.inventory_id == Inventory.id
+        ).filter(
+            counted, difference != 0, adjusted < Inventory.reserved_quantity
+        ).order_by(Inventory.id)
+    ]
+    if conflicts:
+        db.session.rollback()
+        return None, conflicts
+
+    db.session.execute(
+        insert(InventoryCheck).from_select(
+            ['inventory_id', 'expected_quantity', 'actual_quantity', 'difference',
+             'checker_id', 'check_time', 'remark'],
+            select(
+                StocktakeLine.inventory_id,
+                StocktakeLine.expected_quantity,
+                StocktakeLine.counted_quantity,
+                difference,
+                func.coalesce(StocktakeLine.counted_by, user_id),
+                literal(now),
+                literal(f'盘点单 #{session_id}')
+            ).join(
+                Inventory, Inventory.id == StocktakeLine.inventory_id
+            ).where(counted).order_by(StocktakeLine.id)
+        )
+    )
+
+    delta = select(difference).where(
+        StocktakeLine.session_id == session_id,
+        StocktakeLine.inventory_id == Inventory.id
+    ).scalar_subquery()
+    db.session.execute(
+        update(Inventory)
+        .where(Inventory.id.in_(
+            select(StocktakeLine.inventory_id).where(counted, difference != 0)
+        ))
+        .values(quantity=func.max(Inventory.quantity + delta, 0), last_updated=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return StocktakeSession.query.get(session_id), []
@@ -0,0 +1,89 @@
+"""
+SQLite存储配置
+
+按 SQLITE_PRAGMAS 在每个新连接上执行 PRAGMA，并在WAL模式下后台定期执行检查点，
+避免WAL文件无限增长。
+"""
+import logging
+import threading
+from sqlalchemy import event, text
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# 只读回这些PRAGMA用于健康检查
+REPORTED_PRAGMAS = ['journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout', 'temp_store']
+
+
+def configure_storage(app):
+    """为当前应用的引擎注册连接事件，需在首次建立连接前调用"""
+    engine = db.engine
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+    interval = app.config.get('SQLITE_WAL_CHECKPOINT_INTERVAL', 0)
+    if interval and str(pragmas.get('journal_mode', '')).upper() == 'WAL':
+        checkpointer = WalCheckpointer(engine, interval, app.config.get('SQLITE_WAL_CHECKPOINT_MODE', 'PASSIVE'))
+        checkpointer.start()
+        app.extensions['wal_checkpointer'] = checkpointer
+
+
+def get_storage_settings():
+    """读取当前连接上实际生效的存储参数"""
+    engine = db.engine
+    settings = {'dialect': engine.dialect.name}
+
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            for name in REPORTED_PRAGMAS:
+                settings[name] = conn.execute(text(f'PRAGMA {name}')).scalar()
+
+    pool = engine.pool
+    settings['pool'] = {
+        'class': type(pool).__name__,
+        'size': pool.size() if hasattr(pool, 'size') else None,
+        'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None
+    }
+    return settings
+
+
+class WalCheckpointer:
+    """后台线程，定期执行 PRAGMA wal_checkpoint"""
+
+    def __init__(self, engine, interval, mode='PASSIVE'):
+        self.engine = engine
+        self.interval = interval
+        self.mode = mode
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='wal-checkpointer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def checkpoint(self):
+        """立即执行一次检查点，返回 (busy, log, checkpointed)"""
+        with self.engine.connect() as conn:
+            self.last_result = tuple(conn.execute(text(f'PRAGMA wal_checkpoint({self.mode})')).one())
+        return self.last_result
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception:
+                logger.exception('WAL检查点执行失败')
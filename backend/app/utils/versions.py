@@ -0,0 +1,106 @@
+"""
+数据表版本号与条件请求
+
+每张表的增删改由 SQLite 触发器递增 table_versions 中的版本号，
+读接口据此生成 ETag/Last-Modified，客户端携带的 If-None-Match 与当前 ETag 一致时
+直接返回 304，不查询、不序列化任何业务数据。
+Last-Modified 只精确到秒，同一秒内的多次修改无法区分，因此不据此判断 If-Modified-Since。
+"""
+from datetime import timezone
+from functools import wraps
+from flask import current_app, g, make_response, request
+from sqlalchemy import text
+from app import db
+from app.models import TableVersion
+
+VERSIONED_TABLES = [
+    'aluminum_plates',
+    'inventories',
+    'inbound_records',
+    'outbound_records',
+    'dispatch_tasks',
+    'daily_movements',
+    'locations',
+]
+
+
+def ensure_version_triggers():
+    """创建缺失的版本行和触发器"""
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+        }
+        for table_name in VERSIONED_TABLES:
+            conn.execute(text(
+                'INSERT OR IGNORE INTO table_versions (table_name, version, updated_at) '
+                'VALUES (:name, 1, CURRENT_TIMESTAMP)'
+            ), {'name': table_name})
+
+            bump = (
+                'UPDATE table_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP '
+                f"WHERE table_name = '{table_name}';"
+            )
+            for suffix, operation in (('ai', 'INSERT'), ('au', 'UPDATE'), ('ad', 'DELETE')):
+                name = f'{table_name}_version_{suffix}'
+                if name not in existing:
+                    conn.execute(text(
+                        f'CREATE TRIGGER {name} AFTER {operation} ON {table_name} BEGIN {bump} END'
+                    ))
+
+
+def get_versions(tables):
+    """
+    读取多张表的版本
+
+    Returns:
+        (版本号列表（与 tables 顺序一致）, 最近修改时间（UTC）)
+    """
+    rows = {
+        row.table_name: row
+        for row in TableVersion.query.filter(TableVersion.table_name.in_(tables))
+    }
+    versions = [rows[name].version if name in rows else 0 for name in tables]
+    updated = [row.updated_at for row in rows.values() if row.updated_at]
+    return versions, max(updated) if updated else None
+
+
+def conditional_get(*tables, extra=None, versions=None):
+    """
+    为读接口添加 ETag/Last-Modified 与 304 响应
+
+    读到的版本保存在 g.table_versions，视图可直接复用，无需再次查询
+
+    Args:
+        *tables: 接口数据依赖的表
+        extra: 可选函数，返回附加到 ETag 的值（如统计概览依赖的当天日期）
+        versions: 可选函数，返回 (版本号列表, 最近修改时间)，默认调用 get_versions(tables)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if versions is not None:
+                table_versions, last_modified = versions()
+            else:
+                table_versions, last_modified = get_versions(tables)
+            g.table_versions = (table_versions, last_modified)
+            parts = [str(version) for version in table_versions]
+            if extra is not None:
+                parts.append(str(extra()))
+            etag = '.'.join(parts)
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,14 @@
+"""
+重建每日出入库汇总表
+
+首次部署汇总表或修正历史数据后执行一次：python backfill_rollups.py
+"""
+from app.utils.rollups import backfill_daily_movements
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        count = backfill_daily_movements()
+        print(f'每日汇总重建完成，共 {count} 行')
@@ -0,0 +1,5 @@
+"""
+性能基准测试
+
+python -m benchmarks --help
+"""
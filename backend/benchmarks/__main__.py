@@ -0,0 +1,97 @@
+"""
+基准测试命令行入口
+
+示例：
+    python -m benchmarks --scale tiny
+    python -m benchmarks --scale small --save-baseline benchmarks/baselines/small.json
+    python -m benchmarks --scale small --baseline benchmarks/baselines/small.json --fail-on-regression
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='铝板库存平台接口基准测试')
+    parser.add_argument('--scale', default='tiny', help='数据规模: tiny/small/medium/large')
+    parser.add_argument('--db', help='基准数据库文件路径，默认位于系统临时目录')
+    parser.add_argument('--reseed', action='store_true', help='删除已有基准数据库并重新生成')
+    parser.add_argument('--config', default='production', help='应用配置名称')
+    parser.add_argument('--requests', type=int, default=50, help='每个场景的请求次数')
+    parser.add_argument('--warmup', type=int, default=5, help='每个场景的预热请求次数')
+    parser.add_argument('--only', nargs='*', help='只运行名称以这些前缀开头的场景')
+    parser.add_argument('--accept-encoding', default='gzip, br',
+                        help='请求携带的 Accept-Encoding，传空字符串时不压缩响应')
+    parser.add_argument('--output', help='结果JSON输出路径')
+    parser.add_argument('--baseline', help='用于比较的基线JSON')
+    parser.add_argument('--save-baseline', help='将本次结果保存为基线JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='p95 允许的回归比例')
+    parser.add_argument('--fail-on-regression', action='store_true', help='存在回归时以非零状态退出')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from benchmarks.scales import SCALES
+    if args.scale not in SCALES:
+        print(f'未知的数据规模: {args.scale}，可选 {", ".join(SCALES)}')
+        return 2
+
+    db_path = os.path.abspath(args.db or os.path.join(tempfile.gettempdir(), f'aluminum-bench-{args.scale}.db'))
+    if args.reseed:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    needs_seed = not os.path.exists(db_path)
+
+    # 配置在导入时读取 DATABASE_URL，必须在导入 app 之前设置
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    from benchmarks.runner import compare, load_json, run_benchmarks, save_json
+    from benchmarks.seed import seed_database
+
+    app = create_app(args.config)
+    app.config['SQLALCHEMY_ECHO'] = False
+
+    if needs_seed:
+        print(f'生成基准数据 ({args.scale}) -> {db_path}')
+        started = time.perf_counter()
+        with app.app_context():
+            seed_database(**SCALES[args.scale], log=lambda message: print(f'  {message}'))
+        print(f'数据生成耗时 {time.perf_counter() - started:.1f}s')
+
+    login = app.test_client().post('/api/auth/login', json={'username': 'admin', 'password': 'admin123'})
+    token = login.get_json()['token']
+
+    results = run_benchmarks(
+        app, token, requests=args.requests, warmup=args.warmup, only=args.only,
+        accept_encoding=args.accept_encoding
+    )
+    results['meta']['scale'] = args.scale
+    results['meta']['config'] = args.config
+
+    if args.output:
+        save_json(args.output, results)
+    if args.save_baseline:
+        save_json(args.save_baseline, results)
+        print(f'基线已保存: {args.save_baseline}')
+
+    if args.baseline:
+        regressions = compare(results, load_json(args.baseline), tolerance=args.tolerance)
+        if regressions:
+            print('\n与基线相比出现回归:')
+            for name, metric, before, after in regressions:
+                print(f'  {name}: {metric} {before} -> {after}')
+            if args.fail_on_regression:
+                return 1
+        else:
+            print('\n与基线相比无回归')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
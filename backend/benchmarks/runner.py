@@ -0,0 +1,239 @@
+"""
+接口基准测试执行器
+
+通过 Flask 测试客户端依次调用各接口，统计延迟分位数、吞吐量和每次请求的SQL条数。
+"""
+import json
+import os
+import platform
+import sqlite3
+import time
+from datetime import datetime
+from app import db
+from app.models import Inventory, OutboundRecord
+from app.utils.query_counter import count_queries
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _prepare_stocktakes(app, headers, count):
+    """
+    开启 count 个按铝板划分的盘点并提交实盘数（账面数 + 1，不会低于占用数量），供关闭场景使用
+
+    Returns:
+        盘点ID列表
+    """
+    client = app.test_client()
+    session_ids = []
+    for i in range(count):
+        plate_id = i % 100 + 1
+        response = client.post('/api/inventory/stocktakes', json={'plate_id': plate_id}, headers=headers)
+        session_id = response.get_json()['stocktake']['id']
+        with app.app_context():
+            counts = [
+                {'inventory_id': inventory_id, 'actual_quantity': quantity + 1}
+                for inventory_id, quantity in db.session.query(Inventory.id, Inventory.quantity)
+                .filter(Inventory.plate_id == plate_id)
+            ]
+        if counts:
+            client.post(f'/api/inventory/stocktakes/{session_id}/counts', json={'counts': counts}, headers=headers)
+        session_ids.append(session_id)
+    return session_ids
+
+
+def build_scenarios(app, token, iterations, accept_encoding='gzip, br'):
+    """
+    构建基准场景
+
+    Args:
+        iterations: 每个场景的请求次数（含预热），用于预先准备只能使用一次的数据
+        accept_encoding: 所有场景发送的 Accept-Encoding，为空时不发送（响应不压缩）
+
+    Returns:
+        [(名称, 方法, 地址生成函数, 请求体生成函数, 请求头)]，生成函数参数为请求序号
+    """
+    with app.app_context():
+        pending_ids = [
+            outbound_id for (outbound_id,) in db.session.query(OutboundRecord.id)
+            .filter(OutboundRecord.status == 'pending').order_by(OutboundRecord.id.desc()).limit(5000)
+        ]
+        inventory_ids = [
+            inventory_id for (inventory_id,) in db.session.query(Inventory.id).order_by(Inventory.id).limit(2000)
+        ]
+
+    # 单条审批、批量审批、批量拒绝各用一段互不重叠的待审批申请
+    batch_size = 10
+    single_ids = pending_ids[:iterations]
+    approve_ids = pending_ids[iterations:iterations * (1 + batch_size)]
+    reject_ids = pending_ids[iterations * (1 + batch_size):iterations * (1 + 2 * batch_size)]
+
+    def pending(i):
+        return single_ids[i % len(single_ids)] if single_ids else 0
+
+    def batch_of(ids):
+        return lambda i: {'ids': ids[i * batch_size:(i + 1) * batch_size] or [0], 'reason': 'benchmark'}
+
+    def fixed(url):
+        return lambda i: url
+
+    def no_body(i):
+        return None
+
+    headers = {'Authorization': f'Bearer {token}'}
+    if accept_encoding:
+        headers['Accept-Encoding'] = accept_encoding
+
+    client = app.test_client()
+    stocktake_ids = _prepare_stocktakes(app, headers, iterations)
+    counting_id = client.post('/api/inventory/stocktakes', json={}, headers=headers).get_json()['stocktake']['id']
+    job = client.post('/api/jobs', json={'kind': 'inventory_report', 'params': {'format': 'csv'}},
+                      headers=headers).get_json().get('job') or {}
+
+    scenarios = [
+        ('plates.list', 'GET', fixed('/api/plates?per_page=20'), no_body),
+        ('plates.search', 'GET', fixed('/api/plates?search=AL-61'), no_body),
+        ('plates.detail', 'GET', lambda i: f'/api/plates/{i % 100 + 1}', no_body),
+        ('inventory.list', 'GET', fixed('/api/inventory?per_page=50'), no_body),
+        ('inventory.list_deep', 'GET', fixed('/api/inventory?per_page=50&page=200'), no_body),
+        ('inventory.list_cursor', 'GET', fixed('/api/inventory?per_page=50&cursor='), no_body),
+        ('inventory.search', 'GET', fixed('/api/inventory?search=B-001'), no_body),
+        ('inventory.low_stock', 'GET', fixed('/api/inventory?low_stock=true'), no_body),
+        ('inventory.warnings', 'GET', fixed('/api/inventory/warnings'), no_body),
+        ('inventory.checks', 'GET', fixed('/api/inventory/checks'), no_body),
+        ('inbound.list', 'GET', fixed('/api/inbound?per_page=50'), no_body),
+        ('inbound.list_deep', 'GET', fixed('/api/inbound?per_page=50&page=500'), no_body),
+        ('inbound.list_cursor', 'GET', fixed('/api/inbound?per_page=50&cursor='), no_body),
+        ('inbound.filter_model', 'GET', fixed('/api/inbound?plate_model=AL-60'), no_body),
+        ('outbound.list', 'GET', fixed('/api/outbound?per_page=100'), no_body),
+        ('outbound.pending', 'GET', fixed('/api/outbound?status=pending'), no_body),
+        ('tasks.list', 'GET', fixed('/api/tasks?per_page=50'), no_body),
+        ('statistics.overview', 'GET', fixed('/api/statistics/overview'), no_body),
+        ('statistics.inventory', 'GET', fixed('/api/statistics/inventory'), no_body),
+        ('statistics.trend_month', 'GET',
+         fixed('/api/statistics/trend?start_date=2000-01-01&end_date=2100-12-31&group_by=month'), no_body),
+        ('changes.full_sync', 'GET', fixed('/api/changes?since=0&limit=500'), no_body),
+        ('auth.userinfo', 'GET', fixed('/api/auth/userinfo'), no_body),
+        ('jobs.status', 'GET', fixed(f'/api/jobs/{job.get("id")}'), no_body),
+        ('inbound.create', 'POST', fixed('/api/inbound'),
+         lambda i: {'plate_id': i % 100 + 1, 'quantity': 5, 'batch_number': f'BENCH-{i % 50}',
+                    'operator_name': '操作员1'}),
+        ('inbound.batch', 'POST', fixed('/api/inbound/batch'),
+         lambda i: [{'plate_id': (i * 20 + n) % 100 + 1, 'quantity': 3, 'batch_number': f'BENCH-B{n}',
+                     'operator_name': f'操作员{n % 20 + 1}'} for n in range(20)]),
+        ('outbound.create', 'POST', fixed('/api/outbound'),
+         lambda i: {'plate_id': i % 100 + 1, 'quantity': 1, 'applicant_name': '操作员2'}),
+        ('outbound.approve', 'PUT', lambda i: f'/api/outbound/{pending(i)}/approve', lambda i: {}),
+        ('outbound.batch_approve', 'PUT', fixed('/api/outbound/batch/approve'), batch_of(approve_ids)),
+        ('outbound.batch_reject', 'PUT', fixed('/api/outbound/batch/reject'), batch_of(reject_ids)),
+        ('tasks.claim', 'POST', fixed('/api/tasks/claim'), lambda i: {}),
+        ('stocktakes.open', 'POST', fixed('/api/inventory/stocktakes'), lambda i: {'plate_id': i % 100 + 1}),
+        ('stocktakes.counts', 'POST', fixed(f'/api/inventory/stocktakes/{counting_id}/counts'),
+         lambda i: {'counts': [
+             {'inventory_id': inventory_id, 'actual_quantity': i}
+             for inventory_id in inventory_ids[i * 100 % len(inventory_ids):][:100]
+         ]}),
+        ('stocktakes.close', 'PUT', lambda i: f'/api/inventory/stocktakes/{stocktake_ids[i]}/close', no_body),
+    ]
+    return [
+        (name, method, url, body, headers)
+        for name, method, url, body in scenarios
+    ]
+
+
+def run_scenario(app, engine, method, url_for, body_for, headers, requests, warmup):
+    """执行单个场景，返回统计结果"""
+    client = app.test_client()
+    for i in range(warmup):
+        client.open(url_for(i), method=method, json=body_for(i), headers=headers)
+
+    latencies = []
+    errors = 0
+    total_queries = 0
+    response_bytes = 0
+    started = time.perf_counter()
+    for i in range(warmup, warmup + requests):
+        with count_queries(engine) as counter:
+            begin = time.perf_counter()
+            response = client.open(url_for(i), method=method, json=body_for(i), headers=headers)
+            latencies.append((time.perf_counter() - begin) * 1000)
+        total_queries += counter.count
+        response_bytes += len(response.data)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(total_queries / requests, 2),
+        'bytes_per_response': int(response_bytes / requests)
+    }
+
+
+def run_benchmarks(app, token, requests=50, warmup=5, only=None, accept_encoding='gzip, br', log=print):
+    """执行全部（或 only 指定的）场景，返回结果字典"""
+    with app.app_context():
+        engine = db.engine
+
+    results = {}
+    for name, method, url_for, body_for, headers in build_scenarios(app, token, warmup + requests, accept_encoding):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = run_scenario(app, engine, method, url_for, body_for, headers, requests, warmup)
+        stats = results[name]
+        log(f'{name:28s} p50 {stats["p50_ms"]:8.2f}ms  p95 {stats["p95_ms"]:8.2f}ms  '
+            f'p99 {stats["p99_ms"]:8.2f}ms  {stats["throughput_rps"]:8.1f} req/s  '
+            f'{stats["queries_per_request"]:5.1f} SQL  {stats["bytes_per_response"]:8d} B  errors {stats["errors"]}')
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'requests': requests,
+            'warmup': warmup,
+            'accept_encoding': accept_encoding
+        },
+        'endpoints': results
+    }
+
+
+def compare(results, baseline, tolerance=0.2, metric='p95_ms'):
+    """
+    与基线比较，返回回归列表 [(场景, 基线值, 当前值)]
+
+    当前值超过基线 (1 + tolerance) 倍视为回归；SQL条数增加也视为回归。
+    """
+    regressions = []
+    for name, stats in results['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(name)
+        if not base:
+            continue
+        if stats[metric] > base[metric] * (1 + tolerance):
+            regressions.append((name, metric, base[metric], stats[metric]))
+        if stats['queries_per_request'] > base['queries_per_request']:
+            regressions.append((name, 'queries_per_request', base['queries_per_request'],
+                                stats['queries_per_request']))
+    return regressions
+
+
+def load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
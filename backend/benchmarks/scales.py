@@ -0,0 +1,14 @@
+"""
+基准数据规模预设（不依赖 app，可在设置 DATABASE_URL 之前导入）
+"""
+
+SCALES = {
+    'tiny': {'plates': 200, 'batches_per_plate': 5, 'inbound': 5000, 'outbound': 2000,
+             'tasks': 1000, 'checks': 500},
+    'small': {'plates': 1000, 'batches_per_plate': 10, 'inbound': 100000, 'outbound': 50000,
+              'tasks': 10000, 'checks': 5000},
+    'medium': {'plates': 5000, 'batches_per_plate': 20, 'inbound': 1000000, 'outbound': 500000,
+               'tasks': 50000, 'checks': 20000},
+    'large': {'plates': 5000, 'batches_per_plate': 40, 'inbound': 5000000, 'outbound': 5000000,
+              'tasks': 100000, 'checks': 50000},
+}
@@ -0,0 +1,124 @@
+"""
+仓库示例数据生成器
+
+通过 Core executemany 分块写入，生成数百万行数据也只占用单个块的内存。
+"""
+import random
+from datetime import timedelta
+from sqlalchemy import insert
+from app import db
+from app.models import (
+    User, AluminumPlate, Inventory, InboundRecord, OutboundRecord,
+    DispatchTask, InventoryCheck
+)
+from app.utils.locations import backfill_locations
+from app.utils.rollups import backfill_daily_movements
+from app.utils.time_utils import get_beijing_time
+
+CHUNK_SIZE = 10000
+
+USERS = [
+    ('admin', '管理员', 'admin'),
+    ('warehouse', '仓库管理员', 'warehouse'),
+    ('dispatcher', '调度员', 'dispatcher'),
+] + [(f'operator{i}', f'操作员{i}', 'warehouse') for i in range(1, 21)]
+
+
+def _insert_chunked(model, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            db.session.execute(insert(model), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(model), chunk)
+    db.session.commit()
+
+
+def seed_database(plates, batches_per_plate, inbound, outbound, tasks, checks, seed=42, log=None):
+    """
+    写入示例数据（要求数据库中尚无铝板数据）
+
+    铝板型号为 AL-{6000+i}，批次号为 B-{序号:05d}，均可用于搜索类接口的基准测试。
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    now = get_beijing_time()
+
+    if User.query.filter_by(username='admin').first() is None:
+        password_user = User(username='_seed', real_name='_seed')
+        password_user.set_password('123456')
+        password_hash = password_user.password_hash
+        admin = User(username='admin', real_name='管理员', role='admin', status='active')
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.add_all([
+            User(username=username, real_name=real_name, role=role, status='active',
+                 password_hash=password_hash)
+            for username, real_name, role in USERS[1:]
+        ])
+        db.session.commit()
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+
+    log(f'铝板 {plates}')
+    _insert_chunked(AluminumPlate, (
+        {'model': f'AL-{6000 + i}', 'specification': f'{1000 + i % 500}x2000x{i % 10 + 1}mm',
+         'unit': '张', 'supplier': f'供应商{i % 50}'}
+        for i in range(plates)
+    ))
+
+    batch_count = plates * batches_per_plate
+    log(f'库存批次 {batch_count}')
+    _insert_chunked(Inventory, (
+        {'plate_id': p + 1, 'quantity': rng.randint(0, 200), 'reserved_quantity': 0,
+         'batch_number': f'B-{p * batches_per_plate + b:05d}',
+         'location': f'WH1-Z{p % 8 + 1}-R{b % 20 + 1:02d}',
+         'warning_threshold': 10,
+         'received_at': now - timedelta(minutes=p * batches_per_plate + b),
+         'last_updated': now - timedelta(minutes=p * batches_per_plate + b)}
+        for p in range(plates) for b in range(batches_per_plate)
+    ))
+
+    log('库位')
+    backfill_locations()
+
+    log(f'入库记录 {inbound}')
+    _insert_chunked(InboundRecord, (
+        {'plate_id': rng.randint(1, plates), 'quantity': rng.randint(1, 50),
+         'batch_number': f'B-{rng.randrange(batch_count):05d}',
+         'supplier': f'供应商{i % 50}', 'operator_id': rng.choice(user_ids),
+         'inbound_time': now - timedelta(minutes=i * 5)}
+        for i in range(inbound)
+    ))
+
+    log(f'出库记录 {outbound}')
+    _insert_chunked(OutboundRecord, (
+        {'plate_id': rng.randint(1, plates), 'quantity': rng.randint(1, 5),
+         'applicant_id': rng.choice(user_ids),
+         'approver_id': rng.choice(user_ids) if i % 10 else None,
+         'status': 'approved' if i % 10 else 'pending',
+         'outbound_time': now - timedelta(minutes=i * 5) if i % 10 else None}
+        for i in range(outbound)
+    ))
+
+    log(f'调度任务 {tasks}')
+    _insert_chunked(DispatchTask, (
+        {'title': f'任务{i}', 'assignee_id': rng.choice(user_ids), 'creator_id': rng.choice(user_ids),
+         'status': rng.choice(['pending', 'in_progress', 'completed']),
+         'priority': rng.choice(['high', 'medium', 'low']),
+         'due_date': now + timedelta(hours=rng.randint(-48, 240)),
+         'created_at': now - timedelta(minutes=i)}
+        for i in range(tasks)
+    ))
+
+    log(f'盘点记录 {checks}')
+    _insert_chunked(InventoryCheck, (
+        {'inventory_id': i % batch_count + 1, 'expected_quantity': 10, 'actual_quantity': 9,
+         'difference': -1, 'checker_id': rng.choice(user_ids),
+         'check_time': now - timedelta(hours=i)}
+        for i in range(checks)
+    ))
+
+    log('每日汇总')
+    backfill_daily_movements()
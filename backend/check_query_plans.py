@@ -0,0 +1,153 @@
+"""
+查询计划回归检查
+
+在内存数据库中写入示例数据，依次调用各接口，对接口执行的每条SQL运行 EXPLAIN QUERY PLAN，
+出现未在 ALLOWED_SCANS 中登记的全表扫描、SQL语句数超过接口的上限，或响应与预期不符时以非零状态退出：
+python check_query_plans.py
+"""
+import sys
+from app import create_app, db
+from app.utils.query_counter import count_queries
+from app.utils.query_plan import explain, find_full_scans
+from benchmarks.scales import SCALES
+from benchmarks.seed import seed_database
+
+
+def rows(key, minimum=1):
+    """响应中 key 对应的列表至少有 minimum 行"""
+    return lambda body: len(body[key]) >= minimum
+
+
+def item(key, **expected):
+    """响应中 key 对应非空对象，且字段与 expected 一致"""
+    return lambda body: bool(body[key]) and all(body[key].get(name) == value for name, value in expected.items())
+
+
+def outcomes(status, count):
+    """批量审批的每条结果都成功，且状态为 status"""
+    return lambda body: len(body['results']) == count and all(
+        result['success'] and result['status'] == status for result in body['results']
+    )
+
+
+# (方法, 地址, 请求体, 允许的最大SQL语句数, 响应体检查)
+# SQL上限 = 当前实现的语句数 + 2 条余量，与返回的行数无关。列表接口按每页 100 行请求，
+# 序列化时逐行加载关联（N+1）至少多出 100 条，远超余量；新增一次鉴权或版本读取之类的固定开销不会误报。
+# 响应体检查确认接口走的是真实路径（返回了数据、状态确实变化），而不是空结果或提前返回的分支。
+ENDPOINTS = [
+    ('GET', '/api/plates?per_page=100', None, 5, rows('list', 100)),
+    ('GET', '/api/plates?search=6061', None, 5, rows('list')),
+    ('GET', '/api/plates/1', None, 4, lambda body: body['id'] == 1),
+    ('GET', '/api/inventory?per_page=100', None, 5, rows('list', 100)),
+    ('GET', '/api/inventory?search=B-000&per_page=100', None, 5, rows('list', 100)),
+    ('GET', '/api/inventory?low_stock=true&per_page=100', None, 5, rows('list')),
+    ('GET', '/api/inventory?cursor=&per_page=100', None, 4, rows('list', 100)),
+    ('GET', '/api/inventory/1', None, 4, item('inventory', id=1)),
+    ('GET', '/api/inventory/warnings?per_page=100', None, 5, rows('warnings')),
+    ('GET', '/api/inventory/checks?per_page=100', None, 4, rows('checks', 100)),
+    ('GET', '/api/inventory/checks?inventory_id=1', None, 4, rows('checks')),
+    ('GET', '/api/inventory/as-of?date=2030-01-01', None, 8, rows('items', 100)),
+    ('GET', '/api/inventory/as-of?date=2030-01-01&plate_id=1', None, 8, rows('items')),
+    ('GET', '/api/inbound?per_page=100', None, 4, rows('list', 100)),
+    ('GET', '/api/inbound?cursor=&per_page=100', None, 3, rows('list', 100)),
+    ('GET', '/api/inbound?plate_model=6061&start_date=2024-01-01', None, 4, rows('list')),
+    ('GET', '/api/inbound?batch_number=B-000&per_page=100', None, 4, rows('list', 100)),
+    ('GET', '/api/inbound/1', None, 3, item('inbound_record', id=1)),
+    ('GET', '/api/outbound?per_page=100', None, 4, rows('outbounds', 100)),
+    ('GET', '/api/outbound?status=pending&per_page=100', None, 4, rows('outbounds', 100)),
+    ('GET', '/api/outbound?cursor=&per_page=100', None, 3, rows('outbounds', 100)),
+    ('GET', '/api/outbound/1', None, 4, item('outbound', id=1)),
+    ('GET', '/api/tasks?per_page=100', None, 4, rows('tasks', 100)),
+    ('GET', '/api/tasks?status=pending&assignee_id=1', None, 4, rows('tasks')),
+    ('GET', '/api/tasks?cursor=&per_page=100', None, 3, rows('tasks', 100)),
+    ('GET', '/api/tasks/1', None, 3, item('task', id=1)),
+    ('GET', '/api/statistics/overview', None, 9, lambda body: body['total_inventory'] > 0),
+    ('GET', '/api/statistics/inventory', None, 5, rows('by_model', 100)),
+    ('GET', '/api/statistics/locations', None, 4, rows('locations')),
+    ('GET', '/api/statistics/locations?parent=WH1', None, 6, rows('locations')),
+    ('GET', '/api/statistics/locations?parent=WH1-Z1', None, 6, rows('locations')),
+    ('GET', '/api/statistics/trend?start_date=2000-01-01&end_date=2100-12-31&group_by=week', None, 4,
+     rows('trends')),
+    ('GET', '/api/changes?since=0', None, 4, lambda body: any(body['upserts'].values())),
+    ('GET', '/api/changes?since=20', None, 4, lambda body: any(body['upserts'].values())),
+    ('POST', '/api/inbound', {'plate_id': 1, 'quantity': 5, 'batch_number': 'B-00001', 'operator_name': '操作员1'},
+     12, item('inbound_record', plate_id=1, quantity=5)),
+    ('POST', '/api/outbound', {'plate_id': 1, 'quantity': 1}, 16, item('outbound', status='pending')),
+    ('PUT', '/api/outbound/1/approve', {}, 17, item('outbound', status='approved')),
+    # 示例数据中序号为 10 的倍数的申请待审批（ID 1、11、21 ...），ID 1 已在上面单独审批；
+    # 批量审批按铝板分配批次并扣减（每个铝板 3 条SQL），两条申请属于两个铝板
+    ('PUT', '/api/outbound/batch/approve', {'ids': [11, 21]}, 16, outcomes('approved', 2)),
+    ('PUT', '/api/outbound/batch/reject', {'ids': [31, 41], 'reason': 'plan check'}, 8, outcomes('rejected', 2)),
+    ('POST', '/api/inventory/check', {'inventory_id': 1, 'actual_quantity': 50}, 10,
+     item('check', inventory_id=1, actual_quantity=50)),
+]
+
+# 预期内的全表扫描：无筛选条件的 COUNT(*)、全表汇总统计等
+ALLOWED_SCANS = {
+    '/api/plates': {'aluminum_plates'},
+    '/api/inventory': {'inventories'},
+    '/api/inventory/checks': {'inventory_checks'},
+    '/api/inbound': {'inbound_records'},
+    '/api/tasks': {'dispatch_tasks'},
+    '/api/statistics/overview': {'inventories'},
+    '/api/statistics/inventory': {'inventories', 'aluminum_plates', 'locations'},
+    # 快照明细与两次快照之间台账的合并结果，按批次汇总时整体读取
+    '/api/inventory/as-of': {'as_of'},
+    # 找不到申请人/盘点人时回退到 User.query.first()，只读取一行
+    '/api/outbound': {'outbound_records', 'users'},
+    '/api/inventory/check': {'users'},
+}
+
+
+def check_endpoint(app, engine, method, url, body, expect):
+    """调用接口并返回 (执行的SQL语句数, 响应是否符合预期, [(SQL, 被全表扫描的表)])"""
+    client = app.test_client()
+    with count_queries(engine) as counter:
+        response = client.open(url, method=method, json=body)
+    if response.status_code >= 500:
+        raise RuntimeError(f'{method} {url} 返回 {response.status_code}')
+    try:
+        as_expected = response.status_code < 400 and bool(expect(response.get_json()))
+    except (KeyError, TypeError):
+        as_expected = False
+
+    path = url.split('?')[0]
+    allowed = ALLOWED_SCANS.get(path, set())
+    problems = []
+    with engine.connect() as conn:
+        for statement, parameters in counter.executions:
+            if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+                continue
+            scans = set(find_full_scans(explain(conn, statement, parameters))) - allowed
+            if scans:
+                problems.append((statement, sorted(scans)))
+    return counter.count, as_expected, problems
+
+
+def main():
+    app = create_app('testing')
+    with app.app_context():
+        seed_database(**SCALES['tiny'])
+        engine = db.engine
+
+    failed = False
+    for method, url, body, max_queries, expect in ENDPOINTS:
+        query_count, as_expected, problems = check_endpoint(app, engine, method, url, body, expect)
+        over_budget = query_count > max_queries
+        status = 'FAIL' if problems or over_budget or not as_expected else 'ok'
+        print(f'[{status}] {method} {url} ({query_count}/{max_queries} SQL)')
+        if not as_expected:
+            failed = True
+            print('    响应与预期不符，接口没有走到被检查的路径')
+        if over_budget:
+            failed = True
+            print(f'    执行了 {query_count} 条SQL，超过上限 {max_queries}')
+        for statement, scans in problems:
+            failed = True
+            print(f'    全表扫描 {", ".join(scans)}: {" ".join(statement.split())}')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,7 @@
 Flask应用配置文件
 """
 import os
+import tempfile
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -18,14 +19,85 @@ class Config:
     # CORS配置
     CORS_ORIGINS = ['http://localhost:5173', 'http://127.0.0.1:5173']
     
+    # SQLite 连接参数（每个新连接执行 PRAGMA），为空表示使用SQLite默认值
+    SQLITE_PRAGMAS = {}
+    
+    # WAL 检查点间隔（秒），0 表示不启动后台检查点
+    SQLITE_WAL_CHECKPOINT_INTERVAL = 0
+    SQLITE_WAL_CHECKPOINT_MODE = 'PASSIVE'
+    
     # 分页配置
     ITEMS_PER_PAGE = 20
+    
+    # 导出配置（每次从数据库读取的行数）
+    EXPORT_CHUNK_SIZE = 1000
+    
+    # 批量入库单次最多行数
+    INBOUND_BATCH_MAX_LINES = 500
+    
+    # 批量审批单次最多申请数
+    OUTBOUND_BATCH_MAX_IDS = 500
+    
+    # 盘点单次提交实盘数的最多行数
+    STOCKTAKE_MAX_COUNTS = 5000
+    
+    # 统计概览缓存的最长滞后时间（秒），0 表示不缓存
+    OVERVIEW_CACHE_MAX_AGE = 30
+    
+    # 认证用户缓存（容量、有效期秒数）
+    AUTH_CACHE_SIZE = 1024
+    AUTH_CACHE_TTL = 300
+    
+    # 库存预警推送（SSE）：轮询事件表的间隔、单个连接最长保持时间（秒）
+    STOCK_EVENTS_POLL_INTERVAL = 2
+    STOCK_EVENTS_STREAM_TIMEOUT = 300
+    
+    # 库存快照间隔（秒），时点查询最多叠加一个间隔内的台账记录；0 表示不启动快照线程
+    STOCK_SNAPSHOT_INTERVAL = int(os.environ.get('STOCK_SNAPSHOT_INTERVAL', 24 * 3600))
+    
+    # 密码哈希：算法与成本参数需写完整（与哈希值 $ 之前的部分一致），修改后用户下次登录时自动重新哈希
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = 2  # 哈希进程数，0 表示在请求线程中计算
+    PASSWORD_HASH_MAX_PENDING = 32  # 同时等待哈希的请求上限，超出时返回 503
+    PASSWORD_HASH_TIMEOUT = 10
+    
+    # 入库操作员名称缓存（容量、有效期秒数）
+    OPERATOR_CACHE_SIZE = 1024
+    OPERATOR_CACHE_TTL = 300
+    
+    # 后台任务：每个进程的工作线程数、全部进程合计同时执行数、每个用户进行中任务上限
+    JOBS_WORKERS = 2
+    JOBS_MAX_RUNNING = 4
+    JOBS_MAX_ACTIVE_PER_USER = 3
+    JOBS_POLL_INTERVAL = 5  # 秒，其他进程提交的任务最多等待一个间隔被领取
+    JOBS_RESULT_DIR = os.environ.get('JOBS_RESULT_DIR') or os.path.join(tempfile.gettempdir(), 'aluminum-jobs')
+    JOBS_RESULT_TTL = 24 * 3600  # 结果文件保留时间（秒）
+    JOBS_CLEANUP_INTERVAL = 600
+    JOBS_STALE_AFTER = 600  # 执行中任务超过该时间没有进度视为中断
+    
+    # JSON 编码：安装了 orjson 时使用 orjson；JSON_SORT_KEYS 与 Flask 默认行为一致
+    JSON_FAST_ENCODER = True
+    JSON_SORT_KEYS = True
+    
+    # 响应压缩（gzip，安装了 brotli 时支持 br），只压缩超过 COMPRESS_MIN_SIZE 字节的响应
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
+    COMPRESS_MIMETYPES = ['application/json', 'text/csv', 'text/plain', 'text/html']
+    
+    # 接口指标（/api/metrics，Prometheus 文本格式）
+    METRICS_ENABLED = True
+    METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
 
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    
+    # 开发环境不压缩，便于在浏览器和抓包工具中直接查看响应
+    COMPRESS_ENABLED = False
 
 
 class ProductionConfig(Config):
@@ -34,12 +106,40 @@ class ProductionConfig(Config):
     
     # 生产环境应该使用环境变量设置SECRET_KEY
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'production-secret-key-must-be-changed'
+    
+    # SQLite 存储配置：WAL 模式下读写互不阻塞，写锁冲突时等待而不是立即报 database is locked
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),  # 负数单位为KB
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # 毫秒
+        'temp_store': 'MEMORY'
+    }
+    SQLITE_WAL_CHECKPOINT_INTERVAL = int(os.environ.get('SQLITE_WAL_CHECKPOINT_INTERVAL', 300))
+    
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': 30,
+        'pool_recycle': 3600
+    }
+    
+    # 客户端不依赖键顺序，关闭排序以减少编码开销
+    JSON_SORT_KEYS = False
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
 
 
 class TestingConfig(Config):
     """测试环境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    COMPRESS_ENABLED = False
+    
+    # 测试中使用低成本哈希并在当前线程计算
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_WORKERS = 0
+    STOCK_SNAPSHOT_INTERVAL = 0
 
 
 config = {
@@ -3,6 +3,7 @@ Flask应用入口文件
 """
 import os
 from app import create_app
+from app.utils.storage import get_storage_settings
 
 # 从环境变量获取配置名称，默认为development
 config_name = os.getenv('FLASK_ENV', 'development')
@@ -23,10 +24,11 @@ def index():
 
 @app.route('/api/health')
 def health():
-    """健康检查接口"""
+    """健康检查接口（附带当前生效的存储参数）"""
     return {
         'status': 'healthy',
-        'database': 'connected'
+        'database': 'connected',
+        'storage': get_storage_settings()
     }
 
 